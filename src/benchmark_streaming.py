@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Benchmark the streaming detection loop.
+
+Compares, for each detector configuration, the throughput (samples/sec) of:
+- the legacy per-row path (`df.itertuples()` + `DriftDetectorWrapper.add_element`)
+- the array-native core (`streaming_detector.run_detector_on_array`), with the
+  detector engine chosen by `--engine` (e.g. `native` for the in-repo ADWIN,
+  `incremental` for the in-repo KSWIN)
+
+and checks that both produce the same detections (KSWIN samples its reference
+window at random; both runs start from the same NumPy seed).
+
+Usage:
+    python -m src.benchmark_streaming --data data/zenodo_16x/tidy.csv --max-samples 50000
+"""
+from __future__ import annotations
+
+import argparse
+import time
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+from .data_loader import load_dataset
+from .detectors import ENGINES, NATIVE_ENGINES, build_detector
+from .streaming_detector import run_detector_on_array
+
+DEFAULT_CONFIGS = [
+    ('page_hinkley', {'lambda_': 50, 'delta': 0.005}),
+    ('adwin', {'delta': 0.002}),
+    ('kswin', {'alpha': 0.005, 'window_size': 100, 'stat_size': 30}),
+    ('hddm_a', {'drift_confidence': 0.001}),
+    ('hddm_w', {'drift_confidence': 0.001, 'lambda_option': 0.05}),
+]
+
+
+def _legacy_loop(df: pd.DataFrame, detector_name: str, params: dict) -> np.ndarray:
+    detector = build_detector(detector_name, **params)
+    signal = df['ecg'].values
+    hits = []
+    for idx, row in enumerate(df.itertuples()):
+        if detector.add_element(float(signal[idx])):
+            hits.append(row.sample_index)
+    return np.asarray(hits, dtype=np.int64)
+
+
+def _array_core(df: pd.DataFrame, detector_name: str, params: dict, engine: str = 'skmultiflow') -> np.ndarray:
+    detector = build_detector(detector_name, engine=engine, **params)
+    return run_detector_on_array(detector, df['ecg'].values, df['sample_index'].values)
+
+
+def benchmark(df: pd.DataFrame, configs, repeats: int = 1, engine: str = 'skmultiflow') -> List[Dict]:
+    rows = []
+    n = len(df)
+    for detector_name, params in configs:
+        row = {'detector': detector_name, 'params': params, 'n_samples': n}
+        outputs = {}
+        runners = (('legacy', lambda: _legacy_loop(df, detector_name, params)),
+                   ('array', lambda: _array_core(df, detector_name, params, engine)))
+        for label, fn in runners:
+            best = float('inf')
+            for _ in range(repeats):
+                np.random.seed(42)
+                t0 = time.perf_counter()
+                outputs[label] = fn()
+                best = min(best, time.perf_counter() - t0)
+            row[f'{label}_samples_per_sec'] = n / best if best > 0 else float('inf')
+        row['speedup'] = row['array_samples_per_sec'] / row['legacy_samples_per_sec']
+        row['identical'] = bool(np.array_equal(outputs['legacy'], outputs['array']))
+        row['n_detections'] = int(outputs['array'].size)
+        rows.append(row)
+    return rows
+
+
+def main():
+    ap = argparse.ArgumentParser(description='Benchmark do loop de streaming (por linha vs núcleo em arrays)')
+    ap.add_argument('--data', type=str, default=None, help='CSV tidy (id, sample_index, ecg, regime_change); sintético se omitido')
+    ap.add_argument('--sample-rate', type=int, default=250)
+    ap.add_argument('--max-samples', type=int, default=50000, help='Limite de amostras usadas no benchmark')
+    ap.add_argument('--detectors', type=str, default=None, help='Lista separada por vírgulas (default: todos)')
+    ap.add_argument('--engine', type=str, default='skmultiflow', choices=ENGINES,
+                    help='Engine do detector no núcleo em arrays (detetores sem essa engine são ignorados)')
+    ap.add_argument('--repeats', type=int, default=1, help='Repetições por configuração (usa o melhor tempo)')
+    args = ap.parse_args()
+
+    df, _ = load_dataset(args.data, args.sample_rate)
+    if 'id' in df.columns:
+        df = df[df['id'] == df['id'].iloc[0]]
+    df = df.head(args.max_samples).reset_index(drop=True)
+
+    configs = DEFAULT_CONFIGS
+    if args.detectors:
+        wanted = {d.strip() for d in args.detectors.split(',')}
+        configs = [c for c in configs if c[0] in wanted]
+    if args.engine != 'skmultiflow':
+        configs = [c for c in configs
+                   if (args.engine == 'reference' and c[0] in NATIVE_ENGINES)
+                   or args.engine in NATIVE_ENGINES.get(c[0], {})]
+
+    rows = benchmark(df, configs, repeats=args.repeats, engine=args.engine)
+    print(f"{'detector':<14}{'legacy (sps)':>14}{'array (sps)':>14}{'speedup':>10}{'dets':>7}  identical")
+    for r in rows:
+        print(f"{r['detector']:<14}{r['legacy_samples_per_sec']:>14.0f}{r['array_samples_per_sec']:>14.0f}"
+              f"{r['speedup']:>9.2f}x{r['n_detections']:>7}  {r['identical']}")
+
+
+if __name__ == '__main__':
+    main()
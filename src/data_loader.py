@@ -1,7 +1,10 @@
 import os
 import pandas as pd
 import numpy as np
-from typing import Tuple, Optional
+from typing import Dict, Iterable, Tuple, Optional
+
+from .dataset_catalog import get_catalog, read_records, read_tidy_csv, select_records
+from .record_store import RecordStore, is_record_store
 
 SAMPLE_RATE_DEFAULT = 250
 
@@ -60,9 +63,21 @@ def load_dataset(
     force_regenerate: bool = False,
     n_segments: int = 5,
     segment_length: int = 1000,
+    record_ids: Optional[Iterable[str]] = None,
+    max_records: Optional[int] = None,
+    signal_dtype: Optional[str] = None,
 ) -> Tuple[pd.DataFrame, int]:
     """Load dataset; if not exists (or forced) create synthetic with parameters.
 
+    `csv_path` may also be a binary dataset directory (`record_store`), which
+    is memory-mapped instead of parsed. Multi-record CSV files (with an `id`
+    column) get a catalog stored beside them (`dataset_catalog`); `record_ids`
+    and/or `max_records` (the first records in file order) then load only
+    those records' rows. Record ids are returned as a categorical `id` column
+    (integer codes plus the id table), also for files storing `id_code`.
+    `signal_dtype` ('float64'/'float32') casts the `ecg` column; by default it
+    keeps the stored dtype (float64 for CSV).
+
     Returns (dataframe, sample_rate)
     """
     synthetic_default = os.path.join('data', 'synthetic_ecg.csv')
@@ -73,7 +88,18 @@ def load_dataset(
         csv_path = synthetic_default
     if force_regenerate or not os.path.exists(csv_path):
         generate_synthetic_ecg(csv_path, n_segments=n_segments, segment_length=segment_length, sample_rate=sample_rate)
-    df = pd.read_csv(csv_path)
+    if is_record_store(csv_path):
+        df = RecordStore(csv_path).select(record_ids, max_records).to_dataframe()
+    elif record_ids is not None or max_records:
+        selected = select_records(get_catalog(csv_path), record_ids, max_records)
+        df = read_records(csv_path, selected)
+    else:
+        df = read_tidy_csv(csv_path)
+        if 'id' in df.columns:
+            try:
+                get_catalog(csv_path, df)
+            except OSError:
+                pass  # read-only location: run without a catalog
     if 'sample_index' not in df.columns:
         if 'timestamp' in df.columns:
             df = df.sort_values('timestamp').reset_index(drop=True)
@@ -82,5 +108,31 @@ def load_dataset(
             df['sample_index'] = np.arange(len(df))
     if 'regime_change' not in df.columns:
         df['regime_change'] = 0
-    df = df.sort_values('sample_index').reset_index(drop=True)
+    # Dense markers are kept only for the tidy layout (1 byte/sample); use
+    # `regime_events` / `record_events` for the sparse ground truth
+    df['regime_change'] = df['regime_change'].astype(np.int8)
+    if signal_dtype is not None:
+        df['ecg'] = df['ecg'].astype(signal_dtype)
+    # Stable: records keep their file order among equal sample indices
+    df = df.sort_values('sample_index', kind='stable').reset_index(drop=True)
     return df, sample_rate
+
+
+def regime_events(regime_change) -> np.ndarray:
+    """Sorted positions (int64) of the regime changes in a dense 0/1 marker column."""
+    return np.flatnonzero(np.asarray(regime_change) == 1).astype(np.int64)
+
+
+def record_events(df: pd.DataFrame) -> Dict[str, np.ndarray]:
+    """Sorted regime-change positions of every record of a multi-record frame.
+
+    Positions are rows within the record (in frame order), i.e. the row
+    indices of `df[df['id'] == record_id].reset_index(drop=True)`.
+    """
+    codes, ids = pd.factorize(df['id'])
+    order = np.argsort(codes, kind='stable')
+    counts = np.bincount(codes, minlength=len(ids))
+    offsets = np.concatenate(([0], np.cumsum(counts)))
+    changes = regime_events(df['regime_change'].to_numpy()[order])
+    bounds = np.searchsorted(changes, offsets)
+    return {str(rid): changes[bounds[k]:bounds[k + 1]] - offsets[k] for k, rid in enumerate(ids)}
@@ -0,0 +1,223 @@
+"""Per-record catalog of a tidy dataset file, stored beside it.
+
+The catalog is built once per dataset file (keyed by its fingerprint, see
+`preprocessing.dataset_fingerprint`) and lists, for every record in file
+order: its data-row range, the byte range of those rows in the file, the
+record length, the number of regime changes and basic ECG statistics.
+
+With it, a subset of records is read by seeking straight to its bytes instead
+of parsing (and boolean-filtering) the whole file, and runs can be planned from
+record sizes without loading any signal.
+
+Record ids are held as a categorical column in memory. A dataset file may
+also store them as integer codes (`id_code` column) with the id strings in a
+table beside it, written by `write_tidy_csv`; `read_tidy_csv` maps the codes
+back to the `id` column on load.
+
+Layout::
+
+    <dataset>.catalog.json    # {"dataset_fingerprint": ..., "records": {column: [...]}}
+    <dataset>.ids.json        # ["<id of code 0>", "<id of code 1>", ...] (id_code files only)
+"""
+from __future__ import annotations
+import io
+import json
+import os
+from pathlib import Path
+from typing import IO, Iterable, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+from .preprocessing import dataset_fingerprint
+
+CATALOG_COLUMNS = ['id', 'row_start', 'row_stop', 'byte_start', 'byte_stop', 'n_samples',
+                   'n_regime_changes', 'ecg_mean', 'ecg_std', 'ecg_min', 'ecg_max']
+
+
+def catalog_path(data_path: str) -> Path:
+    """`data/tidy.csv` -> `data/tidy.catalog.json`."""
+    path = Path(data_path)
+    return path.with_name(f"{path.stem}.catalog.json")
+
+
+def id_table_path(data_path: str) -> Path:
+    """`data/tidy.csv` -> `data/tidy.ids.json`."""
+    path = Path(data_path)
+    return path.with_name(f"{path.stem}.ids.json")
+
+
+def load_id_table(data_path: str) -> List[str]:
+    path = id_table_path(data_path)
+    if not path.exists():
+        raise FileNotFoundError(f"{data_path} stores record ids as codes (id_code) but {path} is missing")
+    with open(path) as fh:
+        return json.load(fh)
+
+
+def read_tidy_csv(source: Union[str, IO[bytes]], data_path: Optional[str] = None) -> pd.DataFrame:
+    """Read a tidy CSV with the record ids as a categorical `id` column.
+
+    `source` is the file path or a buffer holding (part of) it; `data_path` is
+    then the file, to find its id table. An `id_code` column is decoded
+    through the table into `id` (first column).
+    """
+    data_path = data_path or source
+    df = pd.read_csv(source, dtype={'id': 'category', 'id_code': np.int32})
+    if 'id_code' in df.columns:
+        ids = load_id_table(data_path)
+        codes = df.pop('id_code').to_numpy()
+        if codes.size and codes.max() >= len(ids):
+            raise ValueError(f"{data_path}: id_code {codes.max()} not in {id_table_path(data_path)}")
+        df.insert(0, 'id', pd.Categorical.from_codes(codes, categories=ids))
+    return df
+
+
+def write_tidy_csv(df: pd.DataFrame, data_path: str) -> Path:
+    """Write a tidy frame with its record ids as codes plus the id table."""
+    out = df
+    if 'id' in df.columns:
+        codes, ids = pd.factorize(df['id'])
+        out = df.drop(columns='id')
+        out.insert(0, 'id_code', codes.astype(np.int32))
+        with open(id_table_path(data_path), 'w') as fh:
+            json.dump([str(i) for i in ids], fh)
+    out.to_csv(data_path, index=False)
+    return Path(data_path)
+
+
+def _line_starts(data_path: str, rows: np.ndarray, chunk_bytes: int = 1 << 26) -> np.ndarray:
+    """Byte offset where each data row in `rows` starts (row `n_rows` = end of file)."""
+    rows = np.asarray(rows, dtype=np.int64)
+    newlines = []
+    base = 0
+    with open(data_path, 'rb') as fh:
+        while True:
+            chunk = fh.read(chunk_bytes)
+            if not chunk:
+                break
+            newlines.append(np.flatnonzero(np.frombuffer(chunk, dtype=np.uint8) == ord('\n')) + base)
+            base += len(chunk)
+    # Data row r starts right after newline r (newline 0 ends the header)
+    starts = np.concatenate(newlines + [np.array([base], dtype=np.int64)]) + 1
+    starts[-1] = base
+    return starts[np.minimum(rows, starts.size - 1)]
+
+
+def summarize_records(df: pd.DataFrame) -> pd.DataFrame:
+    """Per-record rows, length, regime-change count and ECG statistics of a tidy frame."""
+    codes, ids = pd.factorize(df['id'])
+    rows = np.arange(len(df))
+    first = np.full(len(ids), len(df), dtype=np.int64)
+    last = np.zeros(len(ids), dtype=np.int64)
+    np.minimum.at(first, codes, rows)
+    np.maximum.at(last, codes, rows)
+    counts = np.bincount(codes, minlength=len(ids))
+
+    ecg = df['ecg'].to_numpy(dtype=float)
+    stats = pd.DataFrame({'code': codes, 'ecg': ecg}).groupby('code', sort=True)['ecg']
+    catalog = pd.DataFrame({
+        'id': [str(i) for i in ids],
+        'row_start': first,
+        'row_stop': last + 1,
+        'n_samples': counts,
+        'n_regime_changes': np.bincount(codes, weights=(df['regime_change'].to_numpy() == 1),
+                                        minlength=len(ids)).astype(np.int64),
+        'ecg_mean': stats.mean().to_numpy(),
+        'ecg_std': stats.std(ddof=0).to_numpy(),
+        'ecg_min': stats.min().to_numpy(),
+        'ecg_max': stats.max().to_numpy(),
+    })
+    return catalog
+
+
+def build_catalog(df: pd.DataFrame, data_path: str) -> pd.DataFrame:
+    """Catalog of `df`, the tidy dataset exactly as read from `data_path` (file row order)."""
+    catalog = summarize_records(df)
+    catalog['byte_start'] = _line_starts(data_path, catalog['row_start'].to_numpy())
+    catalog['byte_stop'] = _line_starts(data_path, catalog['row_stop'].to_numpy())
+    return catalog[CATALOG_COLUMNS]
+
+
+def save_catalog(catalog: pd.DataFrame, data_path: str) -> Path:
+    path = catalog_path(data_path)
+    payload = {
+        'dataset_fingerprint': dataset_fingerprint(data_path),
+        'records': {col: catalog[col].tolist() for col in CATALOG_COLUMNS},
+    }
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, 'w') as fh:
+        json.dump(payload, fh)
+    os.replace(tmp_path, path)
+    return path
+
+
+def load_catalog(data_path: str) -> Optional[pd.DataFrame]:
+    """The stored catalog of `data_path`, or None if missing or stale."""
+    path = catalog_path(data_path)
+    if not path.exists():
+        return None
+    try:
+        with open(path) as fh:
+            payload = json.load(fh)
+    except (ValueError, OSError):
+        return None  # truncated/corrupt catalog: rebuild
+    if payload.get('dataset_fingerprint') != dataset_fingerprint(data_path):
+        return None
+    return pd.DataFrame(payload['records'], columns=CATALOG_COLUMNS)
+
+
+def get_catalog(data_path: str, df: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+    """Load the catalog of `data_path`, building (and storing) it if needed.
+
+    `df` may carry the file already read in row order, to avoid parsing it again.
+    """
+    catalog = load_catalog(data_path)
+    if catalog is None:
+        if df is None:
+            df = read_tidy_csv(data_path)
+        catalog = build_catalog(df, data_path)
+        save_catalog(catalog, data_path)
+    return catalog
+
+
+def select_records(catalog: pd.DataFrame, record_ids: Optional[Iterable[str]] = None,
+                   max_records: Optional[int] = None) -> pd.DataFrame:
+    """Catalog rows of `record_ids` (catalog order) and/or the first `max_records`."""
+    selected = catalog
+    if record_ids is not None:
+        wanted = {str(r) for r in record_ids}
+        selected = selected[selected['id'].isin(wanted)]
+    if max_records:
+        selected = selected.head(max_records)
+    return selected
+
+
+def read_records(data_path: str, catalog: pd.DataFrame) -> pd.DataFrame:
+    """Rows of the records in `catalog` (a selection of the file's catalog).
+
+    Each record's bytes are read directly (one seek per run of adjacent
+    records); the file is parsed in full only when a record's rows are not
+    contiguous in the file.
+    """
+    if not (catalog['row_stop'] - catalog['row_start'] == catalog['n_samples']).all():
+        df = read_tidy_csv(data_path)
+        return df[df['id'].isin(set(catalog['id']))].reset_index(drop=True)
+
+    byte_start = catalog['byte_start'].to_numpy()
+    byte_stop = catalog['byte_stop'].to_numpy()
+    # Merge adjacent byte ranges into single reads
+    order = np.argsort(byte_start, kind='stable')
+    spans = []
+    for start, stop in zip(byte_start[order].tolist(), byte_stop[order].tolist()):
+        if spans and spans[-1][1] == start:
+            spans[-1][1] = stop
+        else:
+            spans.append([start, stop])
+    buf = bytearray()
+    with open(data_path, 'rb') as fh:
+        buf += fh.readline()  # header
+        for start, stop in spans:
+            fh.seek(start)
+            buf += fh.read(stop - start)
+    return read_tidy_csv(io.BytesIO(bytes(buf)), data_path)
@@ -1,7 +1,28 @@
 from __future__ import annotations
-from typing import Dict, Any
+from math import log
+from typing import Dict, Any, List, Sequence
 
-from skmultiflow.drift_detection import PageHinkley, ADWIN, KSWIN, HDDM_A, HDDM_W
+import numpy as np
+
+from . import native_detectors
+
+# Engines accepted by `build_detector(..., engine=...)`:
+#   'skmultiflow' - scikit-multiflow implementation (default)
+#   'native'      - in-repo ADWIN with identical detections
+#   'incremental' - in-repo KSWIN with an incrementally maintained window
+#   'reference'   - the detector's in-repo engine checked sample by sample
+#                   against skmultiflow
+ENGINES = ('skmultiflow', 'native', 'incremental', 'reference')
+NATIVE_ENGINES = {
+    'adwin': {
+        'native': lambda kw: native_detectors.ADWIN(delta=kw.get('delta', 0.002)),
+    },
+    'kswin': {
+        'incremental': lambda kw: native_detectors.KSWIN(alpha=kw.get('alpha', 0.005),
+                                                         window_size=kw.get('window_size', 100),
+                                                         stat_size=kw.get('stat_size', 30)),
+    },
+}
 
 
 class DriftDetectorWrapper:
@@ -9,53 +30,439 @@ class DriftDetectorWrapper:
 
     Methods:
       add_element(value) -> bool: returns True if change detected at this new value.
+      add_elements(values) -> np.ndarray: feeds a chunk, returns offsets (within the
+        chunk) where change was detected.
     """
     def __init__(self, detector, name: str):
         self.detector = detector
         self.name = name
+        # Resolved once instead of a hasattr() per sample
+        self._detected_change = getattr(detector, 'detected_change', None)
+        self._add_elements = getattr(detector, 'add_elements', None)
 
     def add_element(self, value: float) -> bool:
         self.detector.add_element(value)
-        if hasattr(self.detector, 'detected_change'):
-            return bool(self.detector.detected_change())
+        if self._detected_change is not None:
+            return bool(self._detected_change())
         # PageHinkley uses detected_change() method as well
         return False
 
+    def add_elements(self, values) -> np.ndarray:
+        """Feed a chunk of samples in order; return the int64 offsets of detections.
+
+        Detectors with a native batch path (`add_elements`) use it; the rest fall
+        back to a tight loop over bound methods.
+        """
+        if self._add_elements is not None:
+            return np.asarray(self._add_elements(values), dtype=np.int64)
+        values = np.ascontiguousarray(values, dtype=np.float64)
+        add_element = self.detector.add_element
+        detected_change = self._detected_change
+        hits = []
+        if detected_change is not None:
+            for pos, value in enumerate(values.tolist()):
+                add_element(value)
+                if detected_change():
+                    hits.append(pos)
+        else:
+            for value in values.tolist():
+                add_element(value)
+        return np.asarray(hits, dtype=np.int64)
+
+
+class PageHinkleyBank:
+    """K Page-Hinkley detectors over the same stream, advanced in lockstep.
+
+    The state of each configuration (sample count, running mean, cumulative
+    sum, change flag) lives in NumPy arrays, so one pass over the signal serves
+    every (`lambda_`, `delta`, `alpha`) combination. The update is the same
+    floating-point sequence as `skmultiflow.PageHinkley.add_element`, including
+    the reset at the sample following a detection, so detections are identical.
+    Parameters follow `build_detector` (`lambda_` is the threshold).
+    """
+
+    def __init__(self, lambda_: Sequence[float], delta: Sequence[float], alpha: Sequence[float],
+                 min_instances: int = 30):
+        self.threshold, self.delta, self.alpha = (
+            np.array(a, dtype=np.float64) for a in np.broadcast_arrays(lambda_, delta, alpha))
+        self.min_instances = min_instances
+        self.size = self.threshold.size
+        self.reset()
+
+    @classmethod
+    def from_params(cls, params_list: Sequence[Dict[str, Any]]) -> 'PageHinkleyBank':
+        """Build a bank from `build_detector`-style kwargs (same defaults)."""
+        return cls(lambda_=[p.get('lambda_', 50) for p in params_list],
+                   delta=[p.get('delta', 0.005) for p in params_list],
+                   alpha=[p.get('alpha', 1 - 0.9999) for p in params_list])
+
+    def reset(self):
+        self.sample_count = np.ones(self.size)
+        self.x_mean = np.zeros(self.size)
+        self.sum = np.zeros(self.size)
+        self.in_concept_change = np.zeros(self.size, dtype=bool)
+        self.n_seen = 0
+
+    def add_elements(self, values) -> List[np.ndarray]:
+        """Feed a chunk to every configuration; return per-config detection offsets."""
+        values = np.ascontiguousarray(values, dtype=np.float64)
+        count, mean, cusum, change = self.sample_count, self.x_mean, self.sum, self.in_concept_change
+        alpha, delta, threshold = self.alpha, self.delta, self.threshold
+        warmup_end = self.min_instances
+        tmp = np.empty(self.size)
+        hit_pos, hit_cfg = [], []
+        for pos, x in enumerate(values.tolist()):
+            if change.any():
+                count[change] = 1.0
+                mean[change] = 0.0
+                cusum[change] = 0.0
+            # x_mean = x_mean + (x - x_mean) / sample_count
+            np.subtract(x, mean, out=tmp)
+            tmp /= count
+            mean += tmp
+            # sum = max(0, alpha * sum + (x - x_mean - delta))
+            cusum *= alpha
+            np.subtract(x, mean, out=tmp)
+            tmp -= delta
+            cusum += tmp
+            np.maximum(cusum, 0.0, out=cusum)
+            count += 1.0
+            np.greater(cusum, threshold, out=change)
+            change &= count >= warmup_end
+            if change.any():
+                cfg = np.flatnonzero(change)
+                hit_cfg.append(cfg)
+                hit_pos.append(np.full(cfg.size, pos, dtype=np.int64))
+        self.n_seen += values.size
+        return _offsets_by_config(hit_pos, hit_cfg, self.size)
+
+
+class HDDMABank:
+    """K HDDM_A detectors over the same stream, vectorized over configs and time.
+
+    Reproduces `skmultiflow.HDDM_A.add_element` exactly. Between two resets the
+    state is a cumulative count/sum, and the min (max) cut point is the latest
+    sample minimising (maximising) `mean -/+ Hoeffding bound`, so a block of
+    `block_size` samples is evaluated for every config at once with cumulative
+    sums and running min/max; each config then resumes right after its first
+    event (drift, or a mean decrease with `two_side_option`), where the
+    reference resets. `warning_confidence` only drives the warning zone and
+    never changes detections, so it is not needed.
+    """
+
+    def __init__(self, drift_confidence: Sequence[float], two_side_option: Sequence[bool],
+                 block_size: int = 64):
+        drift_confidence, two_side = np.broadcast_arrays(drift_confidence, two_side_option)
+        self.drift_confidence = np.array(drift_confidence, dtype=np.float64)
+        self.two_side_option = np.array(two_side, dtype=bool)
+        self.size = self.drift_confidence.size
+        self.block_size = block_size
+        # log() of the confidences, evaluated like the reference (math.log)
+        self._log_inv = np.array([log(1.0 / c) for c in self.drift_confidence])
+        self._log_two_inv = np.array([log(2.0 / c) for c in self.drift_confidence])
+        self.reset()
+
+    @classmethod
+    def from_params(cls, params_list: Sequence[Dict[str, Any]]) -> 'HDDMABank':
+        """Build a bank from `build_detector`-style kwargs (same defaults)."""
+        return cls(drift_confidence=[p.get('drift_confidence', 0.001) for p in params_list],
+                   two_side_option=[p.get('two_side_option', True) for p in params_list])
+
+    def reset(self):
+        self.total_n = np.zeros(self.size, dtype=np.int64)
+        self.total_c = np.zeros(self.size)
+        self.n_min = np.zeros(self.size, dtype=np.int64)
+        self.c_min = np.zeros(self.size)
+        self.n_max = np.zeros(self.size, dtype=np.int64)
+        self.c_max = np.zeros(self.size)
+        self.n_seen = 0
+
+    @staticmethod
+    def _latest_extreme(stored_value, stored_n, stored_c, values, n, c, better):
+        """Running cut point: the latest sample where `better(value, running)` held."""
+        running = better.accumulate(np.concatenate([stored_value[:, None], values], axis=1), axis=1)
+        replaced = (values <= running[:, :-1]) if better is np.minimum else (running[:, :-1] <= values)
+        cols = np.arange(values.shape[1])
+        last = np.maximum.accumulate(np.where(replaced, cols, -1), axis=1)
+        rows = np.arange(values.shape[0])[:, None]
+        taken = last >= 0
+        safe = np.maximum(last, 0)
+        return (np.where(taken, n[rows, safe], stored_n[:, None]),
+                np.where(taken, c[rows, safe], stored_c[:, None]))
+
+    def add_elements(self, values) -> List[np.ndarray]:
+        """Feed a chunk to every configuration; return per-config detection offsets."""
+        values = np.ascontiguousarray(values, dtype=np.float64)
+        length = values.size
+        pos = np.zeros(self.size, dtype=np.int64)
+        hit_pos, hit_cfg = [], []
+        steps = np.arange(self.block_size)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            active = np.flatnonzero(pos < length)
+            while active.size and length:
+                idx = pos[active, None] + steps
+                valid = idx < length
+                x = np.where(valid, values[np.minimum(idx, length - 1)], 0.0)
+                log_inv = self._log_inv[active, None]
+                log_two_inv = self._log_two_inv[active, None]
+
+                n = self.total_n[active, None] + steps + 1
+                c = np.cumsum(np.concatenate([self.total_c[active, None], x], axis=1), axis=1)[:, 1:]
+                mean = c / n
+                cota1 = np.sqrt(1.0 / (2 * n) * log_inv)
+
+                n_min, c_min = self.n_min[active], self.c_min[active]
+                stored = np.where(n_min == 0, np.inf, c_min / n_min + np.sqrt(1.0 / (2 * n_min) * log_inv[:, 0]))
+                n_min_t, c_min_t = self._latest_extreme(stored, n_min, c_min, mean + cota1, n, c, np.minimum)
+                n_max, c_max = self.n_max[active], self.c_max[active]
+                stored = np.where(n_max == 0, -np.inf, c_max / n_max - np.sqrt(1.0 / (2 * n_max) * log_inv[:, 0]))
+                n_max_t, c_max_t = self._latest_extreme(stored, n_max, c_max, mean - cota1, n, c, np.maximum)
+
+                # _mean_incr / _mean_decr with drift_confidence
+                m = (n - n_min_t) / n_min_t * (1.0 / n)
+                drift = (n_min_t != n) & (mean - c_min_t / n_min_t >= np.sqrt(m / 2 * log_two_inv))
+                m = (n - n_max_t) / n_max_t * (1.0 / n)
+                decrease = (n_max_t != n) & (c_max_t / n_max_t - mean >= np.sqrt(m / 2 * log_two_inv))
+                event = (drift | (decrease & self.two_side_option[active, None])) & valid
+
+                has_event = event.any(axis=1)
+                col = np.where(has_event, event.argmax(axis=1), valid.sum(axis=1) - 1)
+                rows = np.arange(active.size)
+                detected = has_event & drift[rows, col]
+                if detected.any():
+                    hit_cfg.append(active[detected])
+                    hit_pos.append(pos[active[detected]] + col[detected])
+
+                keep = active[~has_event]
+                kept = rows[~has_event]
+                kcol = col[~has_event]
+                self.total_n[keep] = n[kept, kcol]
+                self.total_c[keep] = c[kept, kcol]
+                self.n_min[keep] = n_min_t[kept, kcol]
+                self.c_min[keep] = c_min_t[kept, kcol]
+                self.n_max[keep] = n_max_t[kept, kcol]
+                self.c_max[keep] = c_max_t[kept, kcol]
+                reset = active[has_event]
+                for state in (self.total_n, self.total_c, self.n_min, self.c_min, self.n_max, self.c_max):
+                    state[reset] = 0
+
+                pos[active] += col + 1
+                active = active[pos[active] < length]
+        self.n_seen += length
+        if not hit_cfg:
+            return _offsets_by_config([], [], self.size)
+        # Blocks of different configs interleave: sort positions per config
+        cfg = np.concatenate(hit_cfg)
+        positions = np.concatenate(hit_pos)
+        order = np.lexsort((positions, cfg))
+        return _offsets_by_config([positions[order]], [cfg[order]], self.size)
+
+
+class HDDMWBank:
+    """K HDDM_W detectors over the same stream, advanced in lockstep.
+
+    Mirrors `skmultiflow.HDDM_W.add_element` operation by operation (EWMA of
+    the stream and of the increase monitor, McDiarmid bounds, full reset after
+    a drift), including its treatment of a negative EWMA as "not initialised".
+    Two reference behaviours make some parameters irrelevant to detections:
+    `warning_confidence` only drives the warning zone, and the decrease monitor
+    of `two_side_option` can never fire (its cut point starts at +inf and only
+    moves to values above itself), so neither is modelled.
+    """
 
-def build_detector(name: str, **kwargs) -> DriftDetectorWrapper:
+    def __init__(self, drift_confidence: Sequence[float], lambda_option: Sequence[float]):
+        drift_confidence, lambda_option = np.broadcast_arrays(drift_confidence, lambda_option)
+        self.drift_confidence = np.array(drift_confidence, dtype=np.float64)
+        self.lambda_option = np.array(lambda_option, dtype=np.float64)
+        self.size = self.drift_confidence.size
+        self._decay = 1.0 - self.lambda_option
+        self._lambda_sq = self.lambda_option * self.lambda_option
+        self._decay_sq = self._decay * self._decay
+        self._log_inv = np.array([log(1.0 / c) for c in self.drift_confidence])
+        self._log_inv_bound = np.array([log(1 / c) for c in self.drift_confidence])
+        self.reset()
+
+    @classmethod
+    def from_params(cls, params_list: Sequence[Dict[str, Any]]) -> 'HDDMWBank':
+        """Build a bank from `build_detector`-style kwargs (same defaults)."""
+        return cls(drift_confidence=[p.get('drift_confidence', 0.001) for p in params_list],
+                   lambda_option=[p.get('lambda_option', 0.05) for p in params_list])
+
+    def reset(self):
+        # EWMA estimators of: the stream, increase sample 1 (at the cut point)
+        # and increase sample 2 (since the cut point); -1 means unset
+        self.total_ewma = np.full(self.size, -1.0)
+        self.total_bound_sum = np.zeros(self.size)
+        self.sample1_ewma = np.full(self.size, -1.0)
+        self.sample1_bound_sum = np.zeros(self.size)
+        self.sample2_ewma = np.full(self.size, -1.0)
+        self.sample2_bound_sum = np.zeros(self.size)
+        self.incr_cutpoint = np.full(self.size, np.inf)
+        self.n_seen = 0
+
+    def add_elements(self, values) -> List[np.ndarray]:
+        """Feed a chunk to every configuration; return per-config detection offsets."""
+        values = np.ascontiguousarray(values, dtype=np.float64)
+        lam, decay, lam_sq, decay_sq = self.lambda_option, self._decay, self._lambda_sq, self._decay_sq
+        log_inv, log_inv_bound = self._log_inv, self._log_inv_bound
+        hit_pos, hit_cfg = [], []
+        for pos, x in enumerate(values.tolist()):
+            total_ewma, total_sum = self.total_ewma, self.total_bound_sum
+            s1_ewma, s1_sum = self.sample1_ewma, self.sample1_bound_sum
+            s2_ewma, s2_sum = self.sample2_ewma, self.sample2_bound_sum
+            cutpoint = self.incr_cutpoint
+
+            unset = total_ewma < 0
+            total_sum[:] = np.where(unset, 1.0, lam_sq + decay_sq * total_sum)
+            total_ewma[:] = np.where(unset, x, lam * x + decay * total_ewma)
+
+            # _update_incr_statistics
+            bound = np.sqrt(total_sum * log_inv / 2)
+            new_cut = total_ewma + bound < cutpoint
+            cutpoint[new_cut] = (total_ewma + bound)[new_cut]
+            s1_ewma[new_cut] = total_ewma[new_cut]
+            s1_sum[new_cut] = total_sum[new_cut]
+            s2_ewma[new_cut] = -1.0
+            grow = ~new_cut
+            start = grow & (s2_ewma < 0)
+            cont = grow & ~start
+            s2_sum[:] = np.where(start, 1.0, np.where(cont, lam_sq + decay_sq * s2_sum, s2_sum))
+            s2_ewma[:] = np.where(start, x, np.where(cont, lam * x + decay * s2_ewma, s2_ewma))
+
+            # _monitor_mean_incr(drift_confidence)
+            drift = (s1_ewma >= 0) & (s2_ewma >= 0)
+            if drift.any():
+                drift &= s2_ewma - s1_ewma > np.sqrt((s1_sum + s2_sum) * log_inv_bound / 2)
+            if drift.any():
+                cfg = np.flatnonzero(drift)
+                hit_cfg.append(cfg)
+                hit_pos.append(np.full(cfg.size, pos, dtype=np.int64))
+                total_ewma[drift] = -1.0
+                s1_ewma[drift] = -1.0
+                s2_ewma[drift] = -1.0
+                cutpoint[drift] = np.inf
+        self.n_seen += values.size
+        return _offsets_by_config(hit_pos, hit_cfg, self.size)
+
+
+def _offsets_by_config(hit_pos: List[np.ndarray], hit_cfg: List[np.ndarray], size: int) -> List[np.ndarray]:
+    """Split (position, config) detection hits into one sorted offset array per config."""
+    if not hit_cfg:
+        return [np.empty(0, dtype=np.int64) for _ in range(size)]
+    cfg = np.concatenate(hit_cfg)
+    pos = np.concatenate(hit_pos)
+    order = np.argsort(cfg, kind='stable')  # positions stay sorted within a config
+    bounds = np.searchsorted(cfg[order], np.arange(size + 1))
+    pos = pos[order]
+    return [pos[bounds[k]:bounds[k + 1]] for k in range(size)]
+
+
+def canonical_detector_name(name: str) -> str:
+    """Canonical detector name for `name` and its aliases (e.g. 'ph' -> 'page_hinkley')."""
     name_lower = name.lower()
+    if name_lower == 'ph':
+        return 'page_hinkley'
+    return name_lower.replace('-', '_')
+
+
+def _build_reference_detector(name_lower: str, kwargs: Dict[str, Any]):
+    """Return (canonical name, scikit-multiflow detector) for `name_lower`."""
+    # Imported lazily so native engines work without scikit-multiflow installed
+    from skmultiflow.drift_detection import PageHinkley, ADWIN, KSWIN, HDDM_A, HDDM_W
+
     if name_lower in {"page_hinkley", "ph"}:
         delta = kwargs.get('delta', 0.005)
         lam = kwargs.get('lambda_', 50)  # PageHinkley param is 'lambda_' in lib
         alpha = kwargs.get('alpha', 1 - 0.9999)
-        detector = PageHinkley(delta=delta, threshold=lam, alpha=alpha)
-        return DriftDetectorWrapper(detector, 'page_hinkley')
+        return 'page_hinkley', PageHinkley(delta=delta, threshold=lam, alpha=alpha)
     if name_lower in {"adwin"}:
         delta = kwargs.get('delta', 0.002)
-        detector = ADWIN(delta=delta)
-        return DriftDetectorWrapper(detector, 'adwin')
+        return 'adwin', ADWIN(delta=delta)
     if name_lower in {"kswin"}:
         alpha = kwargs.get('alpha', 0.005)
         window_size = kwargs.get('window_size', 100)
         stat_size = kwargs.get('stat_size', 30)
-        detector = KSWIN(alpha=alpha, window_size=window_size, stat_size=stat_size)
-        return DriftDetectorWrapper(detector, 'kswin')
+        return 'kswin', KSWIN(alpha=alpha, window_size=window_size, stat_size=stat_size)
     if name_lower in {"hddm_a", "hddm-a"}:
         drift_confidence = kwargs.get('drift_confidence', 0.001)
         warning_confidence = kwargs.get('warning_confidence', 0.005)
         two_side_option = kwargs.get('two_side_option', True)
-        detector = HDDM_A(drift_confidence=drift_confidence,
-                         warning_confidence=warning_confidence,
-                         two_side_option=two_side_option)
-        return DriftDetectorWrapper(detector, 'hddm_a')
+        return 'hddm_a', HDDM_A(drift_confidence=drift_confidence,
+                                warning_confidence=warning_confidence,
+                                two_side_option=two_side_option)
     if name_lower in {"hddm_w", "hddm-w"}:
         drift_confidence = kwargs.get('drift_confidence', 0.001)
         warning_confidence = kwargs.get('warning_confidence', 0.005)
         lambda_option = kwargs.get('lambda_option', 0.05)
         two_side_option = kwargs.get('two_side_option', True)
-        detector = HDDM_W(drift_confidence=drift_confidence,
-                         warning_confidence=warning_confidence,
-                         lambda_option=lambda_option,
-                         two_side_option=two_side_option)
-        return DriftDetectorWrapper(detector, 'hddm_w')
-    raise ValueError(f"Detector '{name}' não suportado.")
+        return 'hddm_w', HDDM_W(drift_confidence=drift_confidence,
+                                warning_confidence=warning_confidence,
+                                lambda_option=lambda_option,
+                                two_side_option=two_side_option)
+    raise ValueError(f"Detector '{name_lower}' não suportado.")
+
+
+def build_detector(name: str, engine: str = 'skmultiflow', **kwargs) -> DriftDetectorWrapper:
+    """Build a detector by name.
+
+    `engine` selects the implementation (see `ENGINES`); the in-repo engines
+    available per detector are listed in `NATIVE_ENGINES`.
+    """
+    name_lower = name.lower()
+    if engine not in ENGINES:
+        raise ValueError(f"Engine '{engine}' inválido. Opções: {', '.join(ENGINES)}")
+    if engine == 'skmultiflow':
+        canonical, detector = _build_reference_detector(name_lower, kwargs)
+        return DriftDetectorWrapper(detector, canonical)
+
+    canonical = canonical_detector_name(name)
+    available = NATIVE_ENGINES.get(canonical, {})
+    if engine == 'reference' and available:
+        native = next(iter(available.values()))(kwargs)
+    elif engine in available:
+        native = available[engine](kwargs)
+    else:
+        raise ValueError(f"Detector '{name}' não tem engine '{engine}'.")
+    if engine == 'reference':
+        _, reference = _build_reference_detector(name_lower, kwargs)
+        native = native_detectors.ReferenceCheckedDetector(native, reference)
+    return DriftDetectorWrapper(native, canonical)
+
+
+# Detectors whose decisions draw from the global NumPy RNG (KSWIN samples its
+# reference window with np.random in every engine)
+GLOBAL_RNG_DETECTORS = {'kswin'}
+
+
+class DetectorBank:
+    """K `build_detector` configurations fed from one stream.
+
+    Generic counterpart of the vectorized banks: each chunk of the shared
+    (already preprocessed) signal is handed to every member in turn through
+    `DriftDetectorWrapper.add_elements`, so the record is read, preprocessed
+    and chunked once for the whole grid. `specs` is a list of
+    `(detector_name, kwargs)` pairs as accepted by `build_detector`.
+
+    Members drawing from the global NumPy RNG (`GLOBAL_RNG_DETECTORS`) consume
+    random numbers in chunk-interleaved order; feed them the whole signal as a
+    single chunk (`shares_global_rng`) to get the draws, and detections, of
+    running the configurations one after another.
+    """
+
+    def __init__(self, specs: Sequence[tuple], engine: str = 'skmultiflow'):
+        self.members = [build_detector(name, engine=engine, **dict(kwargs)) for name, kwargs in specs]
+        self.size = len(self.members)
+        self.shares_global_rng = any(m.name in GLOBAL_RNG_DETECTORS for m in self.members)
+        self.n_seen = 0
+
+    @classmethod
+    def from_params(cls, params_list: Sequence[Dict[str, Any]], detector_name: str,
+                    engine: str = 'skmultiflow') -> 'DetectorBank':
+        """Bank of one detector over several `build_detector` kwargs."""
+        return cls([(detector_name, params) for params in params_list], engine=engine)
+
+    def add_elements(self, values) -> List[np.ndarray]:
+        """Feed a chunk to every member; return per-member detection offsets."""
+        values = np.ascontiguousarray(values, dtype=np.float64)
+        self.n_seen += values.size
+        return [member.add_elements(values) for member in self.members]
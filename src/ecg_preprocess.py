@@ -7,7 +7,8 @@ Features implemented:
  - Regime change extraction from annotation label codes (28, 32, 33) as in read_ecg.R
  - Optional resampling from original frequency (often 200 Hz) to target (e.g. 250 Hz) using linear interpolation
  - Cleaning of regime indices (deduplicate near events, drop events too close to edges) mirroring clean_truth()
- - Construction of a tidy DataFrame with columns: id, sample_index, ecg (selected lead), regime_change
+ - Construction of a tidy DataFrame with columns: id (categorical), sample_index, ecg (selected lead), regime_change
+ - Tidy CSV output with record ids as integer codes (id_code) plus an id table (<output>.ids.json)
  - CLI similar to R pre_process.R allowing class filtering and signal selection
 
 Assumptions / Simplifications:
@@ -36,6 +37,10 @@ from typing import List, Sequence
 import numpy as np
 import pandas as pd
 
+from .dataset_catalog import write_tidy_csv
+from .preprocessing import SIGNAL_DTYPES
+from .record_store import RecordStore
+
 
 # -----------------------------
 # Header / file discovery
@@ -221,7 +226,7 @@ def build_regime_changes(annotations: pd.DataFrame | None) -> np.ndarray:
     return np.sort(pts)
 
 
-def load_record(hea_path: Path, resample_to: int | None = None) -> ECGRecord:
+def load_record(hea_path: Path, resample_to: int | None = None, dtype: str = 'float64') -> ECGRecord:
     fs, signal_names = _parse_header(hea_path)
     csv_path = hea_path.with_suffix('.csv.bz2')
     atr_path = hea_path.with_suffix('.atr.csv.bz2')
@@ -235,6 +240,9 @@ def load_record(hea_path: Path, resample_to: int | None = None) -> ECGRecord:
         if regimes_raw.size:
             regimes_raw = (regimes_raw * (len(sig_df) / orig_len)).round().astype(int)
         fs = resample_to
+    if dtype != 'float64':
+        # resampling runs in float64; only the stored signal is rounded
+        sig_df = sig_df.astype(dtype)
     regimes_clean = clean_truth(regimes_raw, len(sig_df)) if regimes_raw.size else regimes_raw
     sig_df.columns = signal_names[: sig_df.shape[1]]
     return ECGRecord(record_id=hea_path.stem, fs=fs, signals=sig_df, annotations=annotations, regimes=regimes_clean)
@@ -244,29 +252,37 @@ def load_record(hea_path: Path, resample_to: int | None = None) -> ECGRecord:
 # Tidy dataset construction
 # -----------------------------
 
+def select_lead(rec: ECGRecord, lead: str = 'II') -> np.ndarray:
+    # fallback to the first column if the lead is missing
+    if lead in rec.signals.columns:
+        return rec.signals[lead].to_numpy()
+    return rec.signals.iloc[:, 0].to_numpy()
+
+
 def build_tidy(records: List[ECGRecord], lead: str = 'II') -> pd.DataFrame:
     rows = []
+    ids = []
     for rec in records:
         if rec.signals.empty:
             continue
-        # choose lead
-        if lead in rec.signals.columns:
-            ecg = rec.signals[lead].to_numpy()
-        else:
-            ecg = rec.signals.iloc[:, 0].to_numpy()
-        regime_vec = np.zeros_like(ecg, dtype=int)
+        ecg = select_lead(rec, lead)
+        regime_vec = np.zeros(len(ecg), dtype=np.int8)
         if rec.regimes.size:
             regime_vec[np.clip(rec.regimes, 0, len(ecg) - 1)] = 1
         df_part = pd.DataFrame({
-            'id': rec.record_id,
             'sample_index': np.arange(len(ecg), dtype=int),
             'ecg': ecg,
             'regime_change': regime_vec,
         })
         rows.append(df_part)
+        ids.append(rec.record_id)
     if not rows:
         return pd.DataFrame(columns=['id', 'sample_index', 'ecg', 'regime_change'])
-    return pd.concat(rows, ignore_index=True)
+    tidy = pd.concat(rows, ignore_index=True)
+    # Record ids as codes into a small table, not one string per sample
+    codes = np.repeat(np.arange(len(ids)), [len(part) for part in rows])
+    tidy.insert(0, 'id', pd.Categorical.from_codes(codes, categories=ids))
+    return tidy
 
 
 # -----------------------------
@@ -280,7 +296,14 @@ def parse_args():
     p.add_argument('--limit-per-class', type=int, default=None, help='Limit number of files per class')
     p.add_argument('--lead', default='II', help='ECG lead to extract (fallback to first if missing)')
     p.add_argument('--resample-to', type=int, default=250, help='Target sampling rate (Hz); if different from original, linear resample applied')
-    p.add_argument('--output', required=True, help='Output CSV path')
+    p.add_argument('--output', required=True,
+                   help='Output CSV path, record ids as id_code + <output>.ids.json '
+                        '(or dataset directory with --format records)')
+    p.add_argument('--signal-dtype', choices=SIGNAL_DTYPES, default='float64',
+                   help='dtype of the ECG signal (float32 halves memory and storage; detections may differ slightly)')
+    p.add_argument('--format', choices=['csv', 'records'], default='csv',
+                   help='csv: tidy CSV; records: binary dataset directory (see record_store), '
+                        'regime changes stored as sparse events')
     return p.parse_args()
 
 
@@ -292,7 +315,7 @@ def main():
     records: List[ECGRecord] = []
     for h in hea_files:
         try:
-            rec = load_record(h, resample_to=args.resample_to)
+            rec = load_record(h, resample_to=args.resample_to, dtype=args.signal_dtype)
             if rec.regimes.size == 0:  # drop records with no regime change
                 continue
             # Drop records with only invalid placeholder values (0, 1, or data_size)
@@ -306,9 +329,17 @@ def main():
         except Exception as e:  # noqa
             # Skip problematic file but continue
             print(f"[WARN] Failed {h.name}: {e}")
+    if args.format == 'records':
+        records = [rec for rec in records if not rec.signals.empty]
+        store = RecordStore.from_records(args.output, [rec.record_id for rec in records],
+                                         [select_lead(rec, args.lead) for rec in records],
+                                         [rec.regimes for rec in records], ecg_dtype=args.signal_dtype,
+                                         source=args.root)
+        print(f"Wrote {store.meta['n_rows']} rows from {len(records)} records to {args.output}")
+        return
     tidy = build_tidy(records, lead=args.lead)
     Path(args.output).parent.mkdir(parents=True, exist_ok=True)
-    tidy.to_csv(args.output, index=False)
+    write_tidy_csv(tidy, args.output)
     print(f"Wrote {len(tidy)} rows from {len(records)} records to {args.output}")
 
 
@@ -17,6 +17,8 @@ import pandas as pd
 from datetime import datetime
 
 from src.evaluation import calculate_comprehensive_metrics
+from src.postfilters import expand_post_filters
+from src.predictions_store import load_predictions
 
 
 def convert_numpy_types(obj):
@@ -97,36 +99,69 @@ def resolve_metric_column(columns: List[str], requested_metric: str) -> str:
     return ''
 
 
+def load_post_filter_grid(predictions_path: str) -> Dict[str, List[Any]]:
+    """Read the default post-filter grid recorded by generate_predictions (if any)."""
+    base = predictions_path.rsplit('.', 1)[0]
+    summary_path = Path(base + '_summary.json')
+    if not summary_path.exists():
+        return {}
+    with open(summary_path, 'r') as f:
+        summary = json.load(f)
+    return summary.get('post_filters') or {}
+
+
+def expand_raw_predictions(predictions_df: pd.DataFrame, post_filters: Dict[str, List[Any]],
+                           param_cols: List[str], sample_rate: int = 250) -> pd.DataFrame:
+    """
+    Expand raw (unfiltered) detections into one row per post-filter combination.
+
+    Post-filter columns (e.g. `min_gap_samples`) are placed right after the
+    detector parameter columns so the output matches the materialized layout.
+    """
+    rows = []
+    for row in predictions_df.to_dict('records'):
+        for filter_params, det_indices in expand_post_filters(row['det_indices'], post_filters):
+            det_list = det_indices.tolist()
+            rows.append({
+                **row,
+                **filter_params,
+                'det_indices': det_list,
+                'det_times': [idx / sample_rate for idx in det_list],
+                'n_detections': len(det_list),
+            })
+
+    expanded = pd.DataFrame(rows)
+    filter_cols = list(post_filters.keys())
+    ordered = param_cols + filter_cols
+    ordered += [col for col in expanded.columns if col not in ordered]
+    return expanded[ordered]
+
+
 def evaluate_predictions_dataset(predictions_path: str, metrics_output_path: str,
-                               tau: float = 10.0, plateau: float = 4.0) -> None:
+                               tau: float = 10.0, plateau: float = 4.0,
+                               post_filters: Dict[str, List[Any]] = None,
+                               sample_rate: int = 250) -> None:
     """
     Evaluate predictions dataset and calculate comprehensive metrics.
 
     Args:
-        predictions_path: Path to predictions CSV/JSON file
+        predictions_path: Path to predictions CSV/JSONL file or predictions store
+            directory (`src/predictions_store.py`)
         metrics_output_path: Path to save metrics results
         tau: Acceptance window in seconds (default 10s)
         plateau: Optimal detection window in seconds (default 4s)
+        post_filters: Post-filter grid applied to raw detections, e.g.
+            `{'min_gap_samples': [500, 1000]}`. Defaults to the grid recorded in
+            the predictions summary JSON. Filters whose column already exists in
+            the predictions (materialized layout) are skipped.
+        sample_rate: Sampling rate used to convert filtered indices to seconds
     """
 
     print(f"Loading predictions from {predictions_path}")
     start_time = time.time()
 
-    # Load predictions dataset
-    if predictions_path.endswith('.jsonl'):
-        # Load from JSON Lines
-        predictions = []
-        with open(predictions_path, 'r') as f:
-            for line in f:
-                predictions.append(json.loads(line.strip()))
-        predictions_df = pd.DataFrame(predictions)
-    else:
-        # Load from CSV
-        predictions_df = pd.read_csv(predictions_path)
-        # Convert string representations back to lists (only if columns exist)
-        for col in ['gt_indices', 'gt_times', 'det_indices', 'det_times']:
-            if col in predictions_df.columns:
-                predictions_df[col] = predictions_df[col].apply(eval)
+    # Load predictions dataset (CSV, JSONL or binary predictions store)
+    predictions_df = load_predictions(predictions_path)
 
     print(f"Loaded {len(predictions_df)} predictions from {predictions_df['record_id'].nunique()} files")
 
@@ -135,24 +170,49 @@ def evaluate_predictions_dataset(predictions_path: str, metrics_output_path: str
                    'gt_indices', 'gt_times', 'det_indices', 'det_times',
                    'n_detections', 'n_ground_truth', 'processing_time', 'error']
     param_cols = [col for col in predictions_df.columns if col not in exclude_cols]
+
+    # Apply lazy post-filters (e.g. min_gap_samples) to raw detections
+    if post_filters is None:
+        post_filters = load_post_filter_grid(predictions_path)
+    pending_filters = {}
+    for name, values in post_filters.items():
+        if name in predictions_df.columns:
+            print(f"Predictions already contain '{name}'; ignoring requested post-filter values")
+        else:
+            pending_filters[name] = values
+    if pending_filters:
+        n_raw = len(predictions_df)
+        predictions_df = expand_raw_predictions(predictions_df, pending_filters, param_cols, sample_rate)
+        param_cols = param_cols + list(pending_filters.keys())
+        print(f"Applied post-filters {pending_filters}: {n_raw} raw predictions -> {len(predictions_df)} rows")
     print(f"Detected parameter columns: {param_cols}")
 
-    # Calculate metrics for each prediction
+    # Calculate metrics for each prediction. Many configurations produce the same
+    # detections for a record: metrics are computed once per distinct
+    # (record, ground truth, duration, detections) and shared by those rows.
     metrics_results = []
+    metrics_cache: Dict[tuple, Any] = {}
 
     for idx, row in predictions_df.iterrows():
         if (idx + 1) % 500 == 0:
             print(f"Processing prediction {idx + 1}/{len(predictions_df)}")
 
         try:
-            # Calculate comprehensive metrics
-            metrics = calculate_comprehensive_metrics(
-                gt=row['gt_times'],
-                det=row['det_times'],
-                tau=tau,
-                plateau=plateau,
-                duration=row['duration_seconds']
-            )
+            key = (row['record_id'], row['duration_seconds'], tuple(row['gt_times']), tuple(row['det_times']))
+            if key not in metrics_cache:
+                try:
+                    metrics_cache[key] = calculate_comprehensive_metrics(
+                        gt=row['gt_times'],
+                        det=row['det_times'],
+                        tau=tau,
+                        plateau=plateau,
+                        duration=row['duration_seconds']
+                    )
+                except Exception as e:
+                    metrics_cache[key] = e
+            metrics = metrics_cache[key]
+            if isinstance(metrics, Exception):
+                raise metrics
 
             # Combine with prediction metadata
             result = {
@@ -198,7 +258,10 @@ def evaluate_predictions_dataset(predictions_path: str, metrics_output_path: str
             metrics_results.append(result)
 
     elapsed_time = time.time() - start_time
-    print(f"Metrics calculation completed in {elapsed_time:.1f}s")
+    n_unique = len(metrics_cache)
+    duplication_rate = 1.0 - n_unique / len(predictions_df) if len(predictions_df) else 0.0
+    print(f"Metrics calculation completed in {elapsed_time:.1f}s "
+          f"({n_unique} unique detection outputs, duplication rate {duplication_rate:.1%})")
 
     # Convert to DataFrame
     metrics_df = pd.DataFrame(metrics_results)
@@ -237,6 +300,9 @@ def evaluate_predictions_dataset(predictions_path: str, metrics_output_path: str
         'evaluation_time_seconds': elapsed_time,
         'tau_acceptance_window': tau,
         'plateau_optimal_window': plateau,
+        'post_filters': pending_filters,
+        'unique_detection_outputs': n_unique,
+        'duplication_rate': duplication_rate,
         'avg_evaluation_time': elapsed_time / len(metrics_results)
     }
 
@@ -260,7 +326,7 @@ def generate_best_parameters_report(metrics_path: str, report_output_path: str)
     print(f"\nGenerating report from metrics: {metrics_path}")
 
     # Load metrics
-    metrics_df = pd.read_csv(metrics_path)
+    metrics_df = pd.read_csv(metrics_path, dtype={'record_id': 'category'})
 
     # Filter valid results (no errors)
     if 'error' in metrics_df.columns:
@@ -851,12 +917,15 @@ def perform_two_fold_analysis(valid_results: pd.DataFrame,
 
 def main():
     parser = argparse.ArgumentParser(description='Evaluate predictions and generate comprehensive metrics')
-    parser.add_argument('--predictions', required=True, help='Path to predictions CSV/JSONL file')
+    parser.add_argument('--predictions', required=True, help='Path to predictions CSV/JSONL file or predictions store directory')
     parser.add_argument('--metrics-output', required=True, help='Output path for metrics CSV')
     parser.add_argument('--report-output', required=True, help='Output path for final report JSON')
     parser.add_argument('--tau', type=float, default=10.0, help='Acceptance window in seconds')
     parser.add_argument('--plateau', type=float, default=4.0, help='Optimal detection window in seconds')
     parser.add_argument('--skip-evaluation', action='store_true', help='Skip metrics calculation (use existing metrics file)')
+    parser.add_argument('--min-gap', type=int, nargs='+', default=None,
+                        help='min_gap_samples values applied to raw detections (default: grid recorded in the predictions summary)')
+    parser.add_argument('--sample-rate', type=int, default=250, help='Sampling rate (Hz) used to convert filtered indices to seconds')
     parser.add_argument('--two-fold-analysis', action='store_true',
                         help='Split arquivos em duas metades reprodutíveis e reportar robustez cruzada')
     parser.add_argument('--two-fold-seed', type=int, default=42,
@@ -870,11 +939,16 @@ def main():
 
     if not args.skip_evaluation:
         # Step 1: Calculate metrics
+        post_filters = None
+        if args.min_gap:
+            post_filters = {'min_gap_samples': args.min_gap}
         metrics_df = evaluate_predictions_dataset(
             predictions_path=args.predictions,
             metrics_output_path=args.metrics_output,
             tau=args.tau,
-            plateau=args.plateau
+            plateau=args.plateau,
+            post_filters=post_filters,
+            sample_rate=args.sample_rate
         )
 
     # Step 2: Generate report
@@ -11,15 +11,25 @@ class DetectionEvent:
     time_seconds: float
 
 
-def evaluate_detections(events: List[DetectionEvent], df: pd.DataFrame, sample_rate: int, tolerance: int = 50) -> Dict[str, float]:
+def _gt_indices(df: pd.DataFrame, gt_indices=None) -> List[int]:
+    if gt_indices is not None:
+        return [int(g) for g in gt_indices]
+    return df.index[df['regime_change'] == 1].tolist()
+
+
+def evaluate_detections(events: List[DetectionEvent], df: pd.DataFrame, sample_rate: int, tolerance: int = 50,
+                        gt_indices=None) -> Dict[str, float]:
     """Evaluate detections vs ground-truth regime_change markers.
 
     tolerance: number of samples allowed between detection and true change start to count as TP.
+    gt_indices: sorted ground-truth change indices (e.g. `data_loader.regime_events`);
+        scanned from `df['regime_change']` when omitted.
     """
     if not events:
-        return {"tp": 0, "fp": 0, "fn": int(df['regime_change'].sum()), "recall": 0.0, "precision": 0.0, "mean_delay_samples": float('nan')}
+        fn = len(gt_indices) if gt_indices is not None else int(df['regime_change'].sum())
+        return {"tp": 0, "fp": 0, "fn": fn, "recall": 0.0, "precision": 0.0, "mean_delay_samples": float('nan')}
 
-    gt_indices = df.index[df['regime_change'] == 1].tolist()
+    gt_indices = _gt_indices(df, gt_indices)
     detections = sorted(events, key=lambda e: e.sample_index)
 
     tp = 0
@@ -242,7 +252,8 @@ def evaluate_detections_comprehensive(
     df: pd.DataFrame,
     sample_rate: int,
     tolerance: int = 50,
-    signal_duration_samples: Optional[int] = None
+    signal_duration_samples: Optional[int] = None,
+    gt_indices=None
 ) -> Dict[str, float]:
     """
     Comprehensive evaluation combining both classic and latency-weighted F1* metrics.
@@ -253,12 +264,16 @@ def evaluate_detections_comprehensive(
         sample_rate: Sampling rate in Hz
         tolerance: Classic tolerance in samples
         signal_duration_samples: Total signal length for FP rate calculation
+        gt_indices: Sorted ground-truth change indices; scanned from `df` when omitted
 
     Returns:
         Dictionary with both classic metrics and F1* metrics
     """
+    if gt_indices is None and len(df) > 0:
+        gt_indices = _gt_indices(df)
+
     # Get classic metrics
-    classic_metrics = evaluate_detections(events, df, sample_rate, tolerance)
+    classic_metrics = evaluate_detections(events, df, sample_rate, tolerance, gt_indices=gt_indices)
 
     if not events:
         # No detections case
@@ -279,8 +294,7 @@ def evaluate_detections_comprehensive(
     # Extract timestamps for F1* calculation
     gt_times = []
     if len(df) > 0:
-        gt_indices = df.index[df['regime_change'] == 1].tolist()
-        gt_times = [idx / sample_rate for idx in gt_indices]
+        gt_times = [idx / sample_rate for idx in _gt_indices(df, gt_indices)]
 
     det_times = [event.time_seconds for event in events]
 
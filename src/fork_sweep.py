@@ -0,0 +1,221 @@
+"""Fork-on-divergence execution of threshold-like parameter sweeps.
+
+Configurations that differ only in a decision parameter (Page-Hinkley's
+`lambda_`, ADWIN's `delta`) update their statistics identically until the
+first sample where they decide differently (one detects and resets, or cuts
+its window, and another does not). A sweep therefore runs one shared detector
+state per *branch* (a set of configurations that agree so far), forks a branch
+only at a sample where its members' decisions split, and merges branches back
+whenever their states become identical again (e.g. two Page-Hinkley branches
+resetting at the same sample).
+
+Both sweeps follow the bank interface of `detectors.PageHinkleyBank`
+(`from_params`, `reset`, `add_elements` -> per-config offsets) and reproduce the
+single-configuration detectors sample for sample.
+"""
+from __future__ import annotations
+from bisect import bisect_left
+from typing import Any, Dict, List, Sequence
+
+import numpy as np
+
+from .detectors import _offsets_by_config
+from .native_detectors import ADWIN
+
+
+def _sorted_members(values: Sequence[float], members: Sequence[int]):
+    """Sort (value, member) pairs by value; return the two aligned lists."""
+    pairs = sorted(zip(values, members))
+    return [v for v, _ in pairs], [m for _, m in pairs]
+
+
+class PageHinkleyForkSweep:
+    """Page-Hinkley configurations sharing state across `lambda_` values.
+
+    Configurations are grouped into families by (`delta`, `alpha`). Each branch
+    of a family keeps one scalar state and its members' thresholds sorted, so a
+    sample's decisions are a single `bisect`: the members whose threshold lies
+    below the cumulative sum detect and reset (forking off if others do not),
+    and all branches of a family resetting at the same sample merge into one.
+    """
+
+    def __init__(self, lambda_: Sequence[float], delta: Sequence[float], alpha: Sequence[float],
+                 min_instances: int = 30):
+        self.threshold, self.delta, self.alpha = (
+            np.array(a, dtype=np.float64) for a in np.broadcast_arrays(lambda_, delta, alpha))
+        self.min_instances = min_instances
+        self.size = self.threshold.size
+        self.reset()
+
+    @classmethod
+    def from_params(cls, params_list: Sequence[Dict[str, Any]]) -> 'PageHinkleyForkSweep':
+        """Build a sweep from `build_detector`-style kwargs (same defaults)."""
+        return cls(lambda_=[p.get('lambda_', 50) for p in params_list],
+                   delta=[p.get('delta', 0.005) for p in params_list],
+                   alpha=[p.get('alpha', 1 - 0.9999) for p in params_list])
+
+    def reset(self):
+        families: Dict[tuple, List[int]] = {}
+        for k, key in enumerate(zip(self.delta.tolist(), self.alpha.tolist())):
+            families.setdefault(key, []).append(k)
+        # Branch: [sample_count, x_mean, sum, reset_pending, thresholds, members]
+        self._families = []
+        for (delta, alpha), members in families.items():
+            thresholds, members = _sorted_members(self.threshold[members].tolist(), members)
+            self._families.append((delta, alpha, [[1.0, 0.0, 0.0, False, thresholds, members]]))
+        self.n_seen = 0
+
+    @property
+    def n_branches(self) -> int:
+        return sum(len(branches) for _, _, branches in self._families)
+
+    def add_elements(self, values) -> List[np.ndarray]:
+        """Feed a chunk to every configuration; return per-config detection offsets."""
+        values = np.ascontiguousarray(values, dtype=np.float64).tolist()
+        warmup_end = self.min_instances
+        hit_pos: List[int] = []
+        hit_cfg: List[int] = []
+        for delta, alpha, branches in self._families:
+            for pos, x in enumerate(values):
+                resetting = []
+                for branch in branches:
+                    count, mean, cusum, pending, thresholds, members = branch
+                    if pending:
+                        count, mean, cusum = 1.0, 0.0, 0.0
+                    mean = mean + (x - mean) / count
+                    cusum = max(0., alpha * cusum + (x - mean - delta))
+                    count += 1.0
+                    branch[0], branch[1], branch[2], branch[3] = count, mean, cusum, False
+                    if count < warmup_end or cusum <= thresholds[0]:
+                        continue
+                    n_detect = bisect_left(thresholds, cusum)
+                    hit_cfg.extend(members[:n_detect])
+                    hit_pos.extend([pos] * n_detect)
+                    if n_detect == len(thresholds):
+                        branch[3] = True
+                        resetting.append(branch)
+                    else:
+                        resetting.append([count, mean, cusum, True, thresholds[:n_detect], members[:n_detect]])
+                        branch[4], branch[5] = thresholds[n_detect:], members[n_detect:]
+                if resetting:
+                    self._merge_resetting(branches, resetting)
+        self.n_seen += len(values)
+        return _offsets_by_config([np.asarray(hit_pos, dtype=np.int64)],
+                                  [np.asarray(hit_cfg, dtype=np.int64)], self.size)
+
+    @staticmethod
+    def _merge_resetting(branches: list, resetting: list):
+        """All branches resetting at the same sample restart from the same state."""
+        merged = resetting[0]
+        if len(resetting) > 1:
+            merged[4], merged[5] = _sorted_members(
+                [t for b in resetting for t in b[4]], [m for b in resetting for m in b[5]])
+        # Keep existing branches in place (identity matters to the caller's loop)
+        kept = [b for b in branches if not b[3]]
+        branches[:] = kept + [merged]
+
+
+class ADWINForkSweep:
+    """ADWIN configurations sharing one bucket histogram across `delta` values.
+
+    Insertion and compression do not depend on `delta`; only the cut check
+    (every `clock` samples) does. At each check the cut test of a branch is
+    evaluated for all its deltas at once (`ADWIN._cut_exists`); members that
+    stop cutting after the same number of dropped buckets stay together, and
+    every other outcome forks a copy of the histogram. Branches whose
+    histograms become identical again are merged.
+    """
+
+    def __init__(self, delta: Sequence[float], clock: int = 32,
+                 min_window_longitude: int = 10, min_window_length: int = 5):
+        self.delta = np.array(delta, dtype=np.float64).reshape(-1)
+        self.clock = clock
+        self.min_window_longitude = min_window_longitude
+        self.min_window_length = min_window_length
+        self.size = self.delta.size
+        self.reset()
+
+    @classmethod
+    def from_params(cls, params_list: Sequence[Dict[str, Any]]) -> 'ADWINForkSweep':
+        """Build a sweep from `build_detector`-style kwargs (same defaults)."""
+        return cls(delta=[p.get('delta', 0.002) for p in params_list])
+
+    def reset(self):
+        root = ADWIN(clock=self.clock, min_window_longitude=self.min_window_longitude,
+                     min_window_length=self.min_window_length)
+        # Branch: (histogram, member config indices)
+        self._branches = [(root, np.arange(self.size))]
+        self._time = 0
+        self.n_seen = 0
+
+    @property
+    def n_branches(self) -> int:
+        return len(self._branches)
+
+    def add_elements(self, values) -> List[np.ndarray]:
+        """Feed a chunk to every configuration; return per-config detection offsets."""
+        values = np.ascontiguousarray(values, dtype=np.float64).tolist()
+        clock, longitude = self.clock, self.min_window_longitude
+        hit_pos: List[np.ndarray] = []
+        hit_cfg: List[np.ndarray] = []
+        start = 0
+        while start < len(values):
+            # Samples up to (and including) the next clock tick are pure inserts
+            stop = min(len(values), start + clock - self._time % clock)
+            segment = values[start:stop]
+            for adwin, _ in self._branches:
+                insert = adwin._insert
+                for value in segment:
+                    insert(value)
+            self._time += len(segment)
+            if self._time % clock == 0:
+                branches = []
+                for adwin, members in self._branches:
+                    if adwin._width > longitude:
+                        for branch, changed in self._cut_fork(adwin, members):
+                            if changed:
+                                hit_cfg.append(branch[1])
+                                hit_pos.append(np.full(branch[1].size, stop - 1, dtype=np.int64))
+                            branches.append(branch)
+                    else:
+                        branches.append((adwin, members))
+                self._branches = self._merge_identical(branches)
+            start = stop
+        self.n_seen += len(values)
+        return _offsets_by_config(hit_pos, hit_cfg, self.size)
+
+    def _cut_fork(self, adwin: ADWIN, members: np.ndarray):
+        """Run the cut loop for every member delta; yield ((histogram, members), changed)."""
+        remaining = members
+        dropped = 0
+        while True:
+            if adwin._width > 0:
+                cut = adwin._cut_exists(self.delta[remaining])
+            else:
+                cut = np.zeros(remaining.size, dtype=bool)
+            stay, go = remaining[~cut], remaining[cut]
+            if go.size == 0:
+                yield (adwin, stay), dropped > 0
+                return
+            if stay.size:
+                yield (adwin.copy(), stay), dropped > 0
+            adwin._delete_oldest_bucket()
+            dropped += 1
+            remaining = go
+
+    @staticmethod
+    def _merge_identical(branches: list) -> list:
+        if len(branches) < 2:
+            return branches
+        merged: Dict[tuple, int] = {}
+        out = []
+        for adwin, members in branches:
+            key = (adwin._width, adwin._total, adwin._variance, adwin._last_row, tuple(adwin._counts))
+            k = merged.get(key)
+            if (k is not None and out[k][0]._totals == adwin._totals
+                    and out[k][0]._variances == adwin._variances):
+                out[k] = (out[k][0], np.concatenate((out[k][1], members)))
+                continue
+            merged[key] = len(out)
+            out.append((adwin, members))
+        return out
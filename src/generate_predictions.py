@@ -9,15 +9,25 @@ Note:
     `src/streaming_detector.py`) and **is not** a parameter of the underlying
     scikit-multiflow detectors. The grids below only enumerate values to test the
     post-processing supression of close detections during evaluation.
+- By default the predictions file stores the raw detections once per
+    (detector params, ma_window); `src/evaluate_predictions.py` applies the
+    `min_gap_samples` values (recorded in the summary JSON) at evaluation time.
+- Each record's results are written to a shard as soon as it completes
+    (`src/prediction_shards.py`); `--resume` continues an interrupted run and
+    the output files are merged from the shards at the end.
 """
 
 import argparse
+import hashlib
 import itertools
 import json
+import os
+import shutil
+import tempfile
 import time
 import random
 from pathlib import Path
-from typing import Dict, List, Any
+from typing import Dict, Iterator, List, Any, Tuple
 
 import numpy as np
 import pandas as pd
@@ -27,8 +37,19 @@ from joblib import Parallel, delayed
 random.seed(42)
 np.random.seed(42)
 
-from src.streaming_detector import run_stream_on_dataframe
-from src.data_loader import load_dataset
+from src.streaming_detector import DEFAULT_BATCH, detect_on_dataframe
+from src.detectors import (ENGINES, GLOBAL_RNG_DETECTORS, DetectorBank, HDDMABank, HDDMWBank,
+                           PageHinkleyBank, canonical_detector_name)
+from src.fork_sweep import ADWINForkSweep, PageHinkleyForkSweep
+from src.utils import chunk_array
+from src.data_loader import load_dataset, regime_events
+from src.dataset_catalog import get_catalog, select_records
+from src.postfilters import apply_min_gaps
+from src.preprocessing import (PREPROCESS_CACHE_DEFAULT, SIGNAL_DTYPES, PreprocessCache, dataset_fingerprint,
+                               preprocess_signals)
+from src.predictions_store import LIST_COLUMNS, PredictionsStore, is_predictions_store
+from src.prediction_shards import PredictionShards, grid_key, shards_dir_for
+from src.record_store import RecordStore, is_record_store
 
 
 def create_param_grid_adwin(custom_params: Dict[str, List[Any]] = None) -> Dict[str, List[Any]]:
@@ -188,131 +209,671 @@ def get_result_columns(detector_name: str) -> List[str]:
         raise ValueError(f"Unknown detector: {detector_name}")
 
 
-def process_single_file_predictions(record_id: str, record_data: pd.DataFrame,
-                                  param_combinations: List[Dict[str, Any]],
-                                  detector_name: str = 'adwin',
-                                  sample_rate: int = 250, max_samples: int = None) -> List[Dict[str, Any]]:
-    """Process a single file and generate predictions for all parameter combinations."""
+# Parameter-equivalence rules per detector, used by `plan_detector_runs`:
+# - 'ignore': axes that never change the detections (the reference
+#   implementations only use them for the warning zone, or the code path they
+#   control can never trigger)
+# - 'invalid': (predicate, reason) pairs for combinations that cannot run
+EQUIVALENCE_RULES: Dict[str, Dict[str, Any]] = {
+    'hddm_a': {
+        # warning_confidence only drives the warning zone
+        'ignore': ['warning_confidence'],
+    },
+    'hddm_w': {
+        # warning_confidence only drives the warning zone; the two-sided
+        # (decrease) monitor of skmultiflow.HDDM_W can never fire
+        'ignore': ['warning_confidence', 'two_side_option'],
+    },
+    'kswin': {
+        # KSWIN needs stat_size < window_size and at least one reference sample
+        'invalid': [(lambda p: p['stat_size'] >= p['window_size'] - 1,
+                     'stat_size must be at most window_size - 2')],
+    },
+}
+
+# Post-filter axes: applied to the raw detections, never part of a run key
+POST_FILTER_PARAMS = ['min_gap_samples']
+
+
+def group_by_detector_config(param_combinations: List[Dict[str, Any]], key_fn=None) -> List[List[int]]:
+    """Group combination indices that differ only in `min_gap_samples`.
+
+    `min_gap_samples` is a post-filter, so every member of a group shares the
+    exact same raw detector output. `key_fn(params)` may map parameters to a
+    canonical form first. Groups keep first-appearance order.
+    """
+    groups: Dict[tuple, List[int]] = {}
+    for i, params in enumerate(param_combinations):
+        params = key_fn(params) if key_fn else params
+        key = tuple(sorted((k, v) for k, v in params.items() if k not in POST_FILTER_PARAMS))
+        groups.setdefault(key, []).append(i)
+    return list(groups.values())
+
+
+def canonical_ma_window(ma_window):
+    """`ma_window` of 1 (or None/0) means no smoothing."""
+    return ma_window if ma_window and ma_window > 1 else 1
+
+
+def canonical_run_params(detector_name: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    """Parameters reduced to what determines the raw detections."""
+    ignore = EQUIVALENCE_RULES.get(canonical_detector_name(detector_name), {}).get('ignore', [])
+    canonical = {k: v for k, v in params.items() if k not in ignore}
+    if 'ma_window' in canonical:
+        canonical['ma_window'] = canonical_ma_window(canonical['ma_window'])
+    return canonical
+
+
+def plan_detector_runs(detector_name: str, param_combinations: List[Dict[str, Any]],
+                       group_min_gap: bool = True, use_equivalences: bool = True):
+    """Collapse the grid into classes of combinations with identical raw detections.
+
+    With `use_equivalences`, the per-detector `EQUIVALENCE_RULES` are applied:
+    ignored axes and `ma_window` <= 1 are canonicalized, and invalid
+    combinations are set aside. Each class is run once (its first member is
+    the representative) and the detections are fanned out to every member.
+
+    Returns `(groups, invalid)`: a list of index lists and a dict mapping the
+    index of each invalid combination to the reason.
+    """
+    invalid: Dict[int, str] = {}
+    if use_equivalences:
+        rules = EQUIVALENCE_RULES.get(canonical_detector_name(detector_name), {}).get('invalid', [])
+        for i, params in enumerate(param_combinations):
+            for predicate, reason in rules:
+                if predicate(params):
+                    invalid[i] = reason
+                    break
+    valid = [i for i in range(len(param_combinations)) if i not in invalid]
+
+    if not group_min_gap:
+        return [[i] for i in valid], invalid
+    key_fn = (lambda p: canonical_run_params(detector_name, p)) if use_equivalences else None
+    groups = group_by_detector_config([param_combinations[i] for i in valid], key_fn)
+    return [[valid[j] for j in members] for members in groups], invalid
+
+
+def _prediction_row(record_id: str, detector: str, params: Dict[str, Any], n_samples: int,
+                    sample_rate: int, gt_indices: List[int], gt_times: List[float],
+                    det_indices: List[int], processing_time: float) -> Dict[str, Any]:
+    return {
+        'record_id': record_id,
+        'detector': detector,
+        **params,  # Include all parameters
+        'duration_samples': n_samples,
+        'duration_seconds': n_samples / sample_rate,
+        'gt_indices': gt_indices,
+        'gt_times': gt_times,
+        'det_indices': det_indices,
+        'det_times': [idx / sample_rate for idx in det_indices],
+        'n_detections': len(det_indices),
+        'n_ground_truth': len(gt_times),
+        'processing_time': processing_time
+    }
+
+
+def detector_bank(detector_name: str, fork_sweeps: bool = False):
+    """Multi-configuration engine for a detector, or None if it has none.
+
+    With `fork_sweeps`, Page-Hinkley and ADWIN use the fork-on-divergence
+    sweeps (`src/fork_sweep.py`) instead.
+    """
+    detector_lower = detector_name.lower()
+    if fork_sweeps and detector_lower == 'adwin':
+        return ADWINForkSweep
+    if detector_lower in ['page_hinkley', 'ph']:
+        return PageHinkleyForkSweep if fork_sweeps else PageHinkleyBank
+    if detector_lower in ['hddm_a', 'hddm-a']:
+        return HDDMABank
+    if detector_lower in ['hddm_w', 'hddm-w']:
+        return HDDMWBank
+    return None
+
+
+def run_raw_detections(detector_name: str, params_list: List[Dict[str, Any]], record_data: pd.DataFrame,
+                       signal: np.ndarray, sample_rate: int, vectorized: bool = True,
+                       engine: str = 'skmultiflow', fork_sweeps: bool = False):
+    """Raw detections (no min_gap) of several detector configs on the same signal.
+
+    With `vectorized`, all configs run in one pass over the signal: through the
+    detector's multi-configuration engine when it has one, otherwise through a
+    generic `DetectorBank` (members sharing the global RNG get the whole signal
+    as one chunk, so their draws match sequential runs). Without it, one
+    streaming run per config. Returns the list of sample-index arrays (in
+    `params_list` order) and the resolved detector name.
+    """
+    if vectorized:
+        detector_params = [extract_detector_params(detector_name, p) for p in params_list]
+        bank_cls = detector_bank(detector_name, fork_sweeps)
+        if bank_cls is not None:
+            bank = bank_cls.from_params(detector_params)
+        else:
+            bank = DetectorBank.from_params(detector_params, detector_name, engine=engine)
+        frame_size = None if getattr(bank, 'shares_global_rng', False) else DEFAULT_BATCH
+        sample_indices = record_data['sample_index'].values
+        found = [[] for _ in params_list]
+        for start, frame in chunk_array(np.ascontiguousarray(signal, dtype=np.float64), frame_size):
+            for k, offsets in enumerate(bank.add_elements(frame)):
+                if offsets.size:
+                    found[k].append(offsets + start)
+        raw = [sample_indices[np.concatenate(f)] if f else np.empty(0, dtype=np.int64) for f in found]
+        return [np.asarray(r, dtype=np.int64) for r in raw], canonical_detector_name(detector_name)
+
+    raw = []
+    actual_detector_name = detector_name
+    for params in params_list:
+        raw_indices, actual_detector_name = detect_on_dataframe(
+            df=record_data,
+            detector_name=detector_name,
+            detector_params=extract_detector_params(detector_name, params),
+            ma_window=params['ma_window'],
+            use_derivative=False,
+            min_gap_samples=None,
+            signal=signal,
+            engine=engine
+        )
+        raw.append(raw_indices)
+    return raw, actual_detector_name
+
+
+def predict_record(record_id: str, record_data: pd.DataFrame,
+                   param_combinations: List[Dict[str, Any]],
+                   detector_name: str = 'adwin',
+                   sample_rate: int = 250, max_samples: int = None,
+                   group_min_gap: bool = True,
+                   preprocess_cache: PreprocessCache = None,
+                   vectorized: bool = True,
+                   engine: str = 'skmultiflow',
+                   use_equivalences: bool = True,
+                   fork_sweeps: bool = False,
+                   signal_dtype: str = 'float64',
+                   gt_indices: np.ndarray = None) -> Dict[str, Any]:
+    """Detections of one record for every parameter combination, in compact form.
+
+    `gt_indices` are the record's sorted regime-change rows (e.g.
+    `RecordStore.record_events`); without them they are taken from the
+    `regime_change` column of `record_data`.
+
+    Returns a dict of arrays (cheap to send back from a worker process):
+    `det_values`/`det_offsets` hold the detections of combination `i` in
+    `det_values[det_offsets[i]:det_offsets[i + 1]]`, plus `processing_time`
+    (per combination), `detector` (resolved name per combination), `errors`
+    (`{combination index: message}`), `gt_indices` and `n_samples`.
+    `expand_record_predictions` turns it into prediction rows.
+
+    With `group_min_gap=True` (default) the detector runs once per
+    (detector params, ma_window) group and every `min_gap_samples` value of the
+    group is derived from the raw detections in a single vectorized pass. Output
+    rows (and their order) are identical to running every combination separately;
+    `processing_time` is the group run time split evenly across its members.
+
+    The smoothed signals for every `ma_window` of the grid are computed up front
+    in a single cumulative-sum pass; when `preprocess_cache` is given they are
+    read from (or written to) the shared on-disk cache instead.
+
+    With `vectorized=True` every config sharing an `ma_window` advances in a
+    single pass over the signal (a multi-configuration engine for Page-Hinkley,
+    HDDM_A and HDDM_W, a generic `DetectorBank` otherwise); detections are
+    identical to the per-config runs. `engine` selects the detector
+    implementation for `DetectorBank` members and per-config runs (see
+    `detectors.ENGINES`).
+
+    With `use_equivalences=True` combinations that only differ in axes the
+    detector ignores (see `EQUIVALENCE_RULES`) are run once and invalid ones
+    get an error row without running (see `plan_detector_runs`).
+
+    With `fork_sweeps=True` (and `vectorized`), Page-Hinkley and ADWIN configs
+    sharing an `ma_window` run as fork-on-divergence sweeps: configs share one
+    detector state until their decisions differ (see `src/fork_sweep.py`).
+
+    `signal_dtype` ('float64' or 'float32') is the dtype the preprocessed
+    signals are kept in (the cache's own dtype when `preprocess_cache` is
+    given); detectors always compute in float64 on the rounded values.
+    """
 
     # Limit samples for testing
     if max_samples and len(record_data) > max_samples:
         record_data = record_data.head(max_samples).copy()
         print(f"  {record_id}: Limited to {max_samples} samples for testing")
 
-    print(f"Processing {record_id}: {len(record_data)} samples, {len(param_combinations)} param combinations")
-
     # Extract ground truth
-    gt_indices = record_data.index[record_data['regime_change'] == 1].tolist()
-    gt_times = [idx / sample_rate for idx in gt_indices]
+    if gt_indices is None:
+        gt_indices = regime_events(record_data['regime_change'])
+    gt_indices = np.asarray(gt_indices, dtype=np.int64)
+    gt_indices = gt_indices[gt_indices < len(record_data)]
 
-    results = []
+    groups, invalid = plan_detector_runs(detector_name, param_combinations, group_min_gap, use_equivalences)
 
-    for i, params in enumerate(param_combinations):
-        if (i + 1) % 50 == 0:
-            print(f"  {record_id}: {i+1}/{len(param_combinations)} combinations")
+    ma_windows = list(dict.fromkeys(params['ma_window'] for params in param_combinations))
+    ecg = record_data['ecg'].values
+    if preprocess_cache is not None:
+        signals = preprocess_cache.get_many(record_id, ecg, ma_windows, use_derivative=False)
+    else:
+        signals = preprocess_signals(ecg, ma_windows, use_derivative=False, dtype=signal_dtype)
+
+    if vectorized:
+        # One pass per ma_window serves every detector config sharing it.
+        # Detectors drawing from the global RNG keep the config order (only
+        # consecutive configs are merged) so their draws match per-config runs.
+        keep_order = canonical_detector_name(detector_name) in GLOBAL_RNG_DETECTORS
+        windowed_runs: List[tuple] = []
+        by_window: Dict[Any, List[List[int]]] = {}
+        for members in groups:
+            window = canonical_ma_window(param_combinations[members[0]]['ma_window'])
+            if keep_order:
+                if windowed_runs and windowed_runs[-1][0] == window:
+                    windowed_runs[-1][1].append(members)
+                else:
+                    windowed_runs.append((window, [members]))
+            elif window in by_window:
+                by_window[window].append(members)
+            else:
+                by_window[window] = [members]
+                windowed_runs.append((window, by_window[window]))
+        runs = [run for _, run in windowed_runs]
+    else:
+        runs = [[members] for members in groups]
+
+    print(f"Processing {record_id}: {len(record_data)} samples, {len(param_combinations)} param combinations "
+          f"({len(groups)} detector configs, {len(runs)} stream passes"
+          f"{f', {len(invalid)} invalid' if invalid else ''})")
 
+    n_combinations = len(param_combinations)
+    detections: List[np.ndarray] = [np.empty(0, dtype=np.int64)] * n_combinations
+    detectors = [detector_name] * n_combinations
+    processing_time = np.zeros(n_combinations)
+    errors: Dict[int, str] = {}
+    n_done = 0
+
+    for i, reason in invalid.items():
+        errors[i] = f"invalid parameters: {reason}"
+
+    for run in runs:
         start_time = time.time()
+        run_members = [i for members in run for i in members]
 
         try:
-            # Configure detector parameters
-            detector_params = extract_detector_params(detector_name, params)
-
-            # Run detection
-            events, metrics, actual_detector_name = run_stream_on_dataframe(
-                df=record_data,
-                detector_name=detector_name,
-                sample_rate=sample_rate,
-                tolerance=500,  # Not used for evaluation here, just for compatibility
-                detector_params=detector_params,
-                ma_window=params['ma_window'],
-                use_derivative=False,
-                min_gap_samples=params['min_gap_samples']
-            )
-
-            # Extract detection times
-            det_times = [event.time_seconds for event in events]
-            det_indices = [event.sample_index for event in events]
-
-            result = {
-                'record_id': record_id,
-                'detector': actual_detector_name,
-                **params,  # Include all parameters
-                'duration_samples': len(record_data),
-                'duration_seconds': len(record_data) / sample_rate,
-                'gt_indices': gt_indices,
-                'gt_times': gt_times,
-                'det_indices': det_indices,
-                'det_times': det_times,
-                'n_detections': len(events),
-                'n_ground_truth': len(gt_times),
-                'processing_time': time.time() - start_time
-            }
-
-            results.append(result)
+            base_params = [param_combinations[members[0]] for members in run]
+            signal = signals[base_params[0]['ma_window']]
+            raw_by_group, actual_detector_name = run_raw_detections(
+                detector_name, base_params, record_data, signal, sample_rate, vectorized, engine,
+                fork_sweeps)
+
+            # min_gap_samples is applied to the raw detections; combinations
+            # without it keep the raw detections
+            for members, raw_indices in zip(run, raw_by_group):
+                gaps = [param_combinations[i].get('min_gap_samples') for i in members]
+                filtered = apply_min_gaps(raw_indices, {g for g in gaps if g is not None})
+                for i, g in zip(members, gaps):
+                    detections[i] = raw_indices if g is None else filtered[g]
+                    detectors[i] = actual_detector_name
 
         except Exception as e:
-            result = {
-                'record_id': record_id,
-                'detector': detector_name,
-                **params,  # Include all parameters
-                'duration_samples': len(record_data),
-                'duration_seconds': len(record_data) / sample_rate,
-                'gt_indices': gt_indices,
-                'gt_times': gt_times,
-                'det_indices': [],
-                'det_times': [],
-                'n_detections': 0,
-                'n_ground_truth': len(gt_times),
-                'processing_time': time.time() - start_time,
-                'error': str(e)
-            }
-            results.append(result)
+            for i in run_members:
+                detections[i] = np.empty(0, dtype=np.int64)
+                detectors[i] = detector_name
+                errors[i] = str(e)
+
+        processing_time[run_members] = (time.time() - start_time) / len(run_members)
+
+        done_before = n_done
+        n_done += len(run_members)
+        if n_done // 50 > done_before // 50:
+            print(f"  {record_id}: {n_done}/{len(param_combinations)} combinations")
+
+    det_offsets = np.zeros(n_combinations + 1, dtype=np.int64)
+    np.cumsum([d.size for d in detections], out=det_offsets[1:])
+    return {
+        'record_id': record_id,
+        'n_samples': len(record_data),
+        'gt_indices': gt_indices.astype(np.int64),
+        'detector': detectors,
+        'det_values': np.concatenate(detections).astype(np.int64) if detections else np.empty(0, dtype=np.int64),
+        'det_offsets': det_offsets,
+        'processing_time': processing_time,
+        'errors': errors,
+    }
 
+
+def expand_record_predictions(compact: Dict[str, Any], param_combinations: List[Dict[str, Any]],
+                              sample_rate: int = 250) -> List[Dict[str, Any]]:
+    """Prediction rows (one per combination, in order) from `predict_record` output."""
+    gt_indices = compact['gt_indices'].tolist()
+    gt_times = [idx / sample_rate for idx in gt_indices]
+    values, offsets = compact['det_values'], compact['det_offsets']
+    results = []
+    for i, params in enumerate(param_combinations):
+        result = _prediction_row(
+            compact['record_id'], compact['detector'][i], params, compact['n_samples'],
+            sample_rate, gt_indices, gt_times, values[offsets[i]:offsets[i + 1]].tolist(),
+            float(compact['processing_time'][i])
+        )
+        if i in compact['errors']:
+            result['error'] = compact['errors'][i]
+        results.append(result)
     return results
 
 
-def load_existing_predictions(file_path: str) -> pd.DataFrame:
-    """Load existing predictions CSV if it exists."""
-    path = Path(file_path)
-    if path.exists():
-        print(f"Loading existing predictions from {file_path}")
-        df = pd.read_csv(file_path)
-        print(f"Found {len(df)} existing predictions")
-        return df
-    return pd.DataFrame()
+def predictions_store_parts(compact_results: List[Dict[str, Any]], param_combinations: List[Dict[str, Any]],
+                            sample_rate: int = 250) -> Dict[str, Any]:
+    """`PredictionsStore.write` arguments for `predict_record` outputs.
 
+    Same rows, columns and order as `expand_record_predictions` over the
+    records, without building per-row lists: the table is tiled from the
+    parameter grid and the detection arrays are concatenated as they are.
+    """
+    n_records, n_combinations = len(compact_results), len(param_combinations)
+    record_codes = np.repeat(np.arange(n_records), n_combinations)
+    n_samples = np.repeat([c['n_samples'] for c in compact_results], n_combinations)
+    det_sizes = [np.diff(c['det_offsets']) for c in compact_results]
+    det_offsets = np.zeros(n_records * n_combinations + 1, dtype=np.int64)
+    if det_sizes:
+        np.cumsum(np.concatenate(det_sizes), out=det_offsets[1:])
+    gt_sizes = [c['gt_indices'].size for c in compact_results]
+    gt_offsets = np.concatenate(([0], np.cumsum(gt_sizes))).astype(np.int64)
+
+    columns = {
+        'record_id': pd.Categorical.from_codes(record_codes, categories=[c['record_id'] for c in compact_results]),
+        'detector': [name for c in compact_results for name in c['detector']],
+    }
+    for key in (param_combinations[0] if param_combinations else {}):
+        values = np.empty(n_combinations, dtype=object)
+        values[:] = [params[key] for params in param_combinations]
+        columns[key] = pd.Series(np.tile(values, n_records)).infer_objects()
+    columns['duration_samples'] = n_samples
+    columns['duration_seconds'] = n_samples / sample_rate
+    columns['n_detections'] = np.diff(det_offsets)
+    columns['n_ground_truth'] = np.repeat(gt_sizes, n_combinations).astype(np.int64)
+    columns['processing_time'] = (np.concatenate([c['processing_time'] for c in compact_results])
+                                  if compact_results else np.empty(0))
+    order = list(columns)
+    if any(c['errors'] for c in compact_results):
+        errors = np.full(n_records * n_combinations, np.nan, dtype=object)
+        for r, c in enumerate(compact_results):
+            for i, message in c['errors'].items():
+                errors[r * n_combinations + i] = message
+        columns['error'] = errors
+        order.append('error')
+    table = pd.DataFrame(columns)
+    # CSV layout: list columns right after the durations
+    pos = order.index('duration_seconds') + 1
+    order[pos:pos] = ['gt_indices', 'gt_times', 'det_indices', 'det_times']
+    return {
+        'table': table,
+        'det_values': (np.concatenate([c['det_values'] for c in compact_results])
+                       if compact_results else np.empty(0, dtype=np.int64)),
+        'det_offsets': det_offsets,
+        'gt_values': (np.concatenate([c['gt_indices'] for c in compact_results])
+                      if compact_results else np.empty(0, dtype=np.int64)),
+        'gt_offsets': gt_offsets,
+        'gt_slot': record_codes,
+        'sample_rate': sample_rate,
+        'columns': order,
+    }
+
+
+def process_single_file_predictions(record_id: str, record_data: pd.DataFrame,
+                                  param_combinations: List[Dict[str, Any]],
+                                  detector_name: str = 'adwin',
+                                  sample_rate: int = 250, max_samples: int = None,
+                                  group_min_gap: bool = True,
+                                  preprocess_cache: PreprocessCache = None,
+                                  vectorized: bool = True,
+                                  engine: str = 'skmultiflow',
+                                  use_equivalences: bool = True,
+                                  fork_sweeps: bool = False,
+                                  signal_dtype: str = 'float64') -> List[Dict[str, Any]]:
+    """Process a single file and generate predictions for all parameter combinations.
+
+    Row form of `predict_record` (same arguments).
+    """
+    compact = predict_record(record_id, record_data, param_combinations, detector_name, sample_rate,
+                             max_samples, group_min_gap, preprocess_cache, vectorized, engine,
+                             use_equivalences, fork_sweeps, signal_dtype)
+    return expand_record_predictions(compact, param_combinations, sample_rate)
+
+
+def _predict_stored_record(store: RecordStore, k: int, param_combinations: List[Dict[str, Any]],
+                           *args, rng_seed: int = None) -> Dict[str, Any]:
+    """Worker task: `predict_record` on record `k` of the memory-mapped store.
+
+    `rng_seed` seeds the global NumPy RNG first (detectors drawing from it,
+    see `GLOBAL_RNG_DETECTORS`, then repeat their draws across runs).
+    """
+    if rng_seed is not None:
+        np.random.seed(rng_seed)
+    return predict_record(store.ids[k], store.record_frame(k, columns=('sample_index', 'ecg')),
+                          param_combinations, *args, gt_indices=store.record_events(k))
+
+
+def _predict_store(store: RecordStore, param_combinations: List[Dict[str, Any]], task_args: tuple,
+                   n_jobs: int, record_cost: Dict[str, int], rng_seed: int = None,
+                   records: List[int] = None) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """`predict_record` on records `records` of `store` (default: all).
+
+    Yields `(k, compact)` as records complete (in any order with `n_jobs != 1`),
+    so results can be written out without holding them all. With `rng_seed`,
+    record `k` runs with the global RNG seeded to `rng_seed + k`.
+    """
+    def seed(k):
+        return None if rng_seed is None else rng_seed + k
+
+    records = range(len(store)) if records is None else records
+    if n_jobs == 1:
+        for k in records:
+            yield k, _predict_stored_record(store, k, param_combinations, *task_args, rng_seed=seed(k))
+        return
+    # Parallel processing; longest records first, so the pool does not end
+    # waiting on one large record started last
+    print("Starting parallel prediction generation...")
+    dispatch = sorted(records, key=lambda k: -record_cost[store.ids[k]])
+    index = {store.ids[k]: k for k in dispatch}
+    for compact in Parallel(n_jobs=n_jobs, return_as='generator_unordered')(
+        delayed(_predict_stored_record)(store, k, param_combinations, *task_args, rng_seed=seed(k))
+        for k in dispatch
+    ):
+        yield index[compact['record_id']], compact
+
+
+def _collect(n_records: int, results: Iterator[Tuple[int, Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """`_predict_store` results in store order."""
+    compact_results = [None] * n_records
+    for k, compact in results:
+        compact_results[k] = compact
+    return compact_results
+
+
+def dtype_parity_report(reference: List[Dict[str, Any]], candidate: List[Dict[str, Any]],
+                        param_combinations: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Compare the compact results of two runs of the same records and grid.
+
+    Returns the number of (record, combination) predictions whose detections
+    differ, the records and combinations involved, and the largest difference
+    in detection count.
+    """
+    n_differing = 0
+    max_count_diff = 0
+    records, combinations = [], set()
+    for ref, cand in zip(reference, candidate):
+        ref_offsets, cand_offsets = ref['det_offsets'], cand['det_offsets']
+        record_differs = False
+        for i in range(len(param_combinations)):
+            a = ref['det_values'][ref_offsets[i]:ref_offsets[i + 1]]
+            b = cand['det_values'][cand_offsets[i]:cand_offsets[i + 1]]
+            if not np.array_equal(a, b):
+                n_differing += 1
+                combinations.add(i)
+                record_differs = True
+                max_count_diff = max(max_count_diff, abs(a.size - b.size))
+        if record_differs:
+            records.append(ref['record_id'])
+    return {
+        'n_predictions': len(reference) * len(param_combinations),
+        'n_differing': n_differing,
+        'differing_records': records,
+        'differing_combinations': [param_combinations[i] for i in sorted(combinations)],
+        'max_detection_count_diff': max_count_diff,
+    }
+
+
+def _write_shard_rows(shards: PredictionShards, entries: List[Dict[str, Any]],
+                      param_combinations: List[Dict[str, Any]], sample_rate: int,
+                      csv_fh, jsonl_fh, columns: List[str] = None) -> None:
+    """Append the rows of `entries` to open CSV/JSONL files, one record at a time."""
+    has_errors = any(entry['n_errors'] for entry in entries)
+    for entry in entries:
+        rows = expand_record_predictions(shards.read(entry), param_combinations, sample_rate)
+        if columns is None:
+            columns = [c for c in rows[0] if c != 'error'] + (['error'] if has_errors else [])
+        pd.DataFrame(rows, columns=columns).to_csv(csv_fh, header=csv_fh.tell() == 0, index=False)
+        for row in rows:
+            jsonl_fh.write(json.dumps(row) + '\n')
+
+
+def _add_error_column(csv_path: str) -> None:
+    """Add an empty `error` column to a predictions CSV (whose cells hold no newlines)."""
+    print(f"Adding an 'error' column to {csv_path}")
+    tmp_path = csv_path + '.tmp'
+    with open(csv_path) as src, open(tmp_path, 'w') as dst:
+        for n, line in enumerate(src):
+            dst.write(line.rstrip('\n') + (',error\n' if n == 0 else ',\n'))
+    os.replace(tmp_path, csv_path)
+
+
+def merge_shards_csv(shards: PredictionShards, entries: List[Dict[str, Any]],
+                     param_combinations: List[Dict[str, Any]], sample_rate: int,
+                     csv_path: str, jsonl_path: str, append: bool = False) -> None:
+    """Write the predictions CSV and JSONL from shards, one record at a time.
+
+    Same rows and columns as expanding every record at once; both files are
+    written under a temporary name and renamed when complete. With `append`,
+    the rows are added at the end of the existing files instead (in the
+    CSV's column order), and both are truncated back if writing fails.
+    """
+    if not append:
+        tmp_csv, tmp_jsonl = csv_path + '.tmp', jsonl_path + '.tmp'
+        with open(tmp_csv, 'w', newline='') as csv_fh, open(tmp_jsonl, 'w') as jsonl_fh:
+            _write_shard_rows(shards, entries, param_combinations, sample_rate, csv_fh, jsonl_fh)
+        os.replace(tmp_csv, csv_path)
+        os.replace(tmp_jsonl, jsonl_path)
+        return
+
+    columns = pd.read_csv(csv_path, nrows=0).columns.tolist()
+    if 'error' not in columns and any(entry['n_errors'] for entry in entries):
+        _add_error_column(csv_path)
+        columns.append('error')
+    sizes = {path: os.path.getsize(path) if os.path.exists(path) else 0 for path in (csv_path, jsonl_path)}
+    try:
+        with open(csv_path, 'a', newline='') as csv_fh, open(jsonl_path, 'a') as jsonl_fh:
+            _write_shard_rows(shards, entries, param_combinations, sample_rate, csv_fh, jsonl_fh, columns)
+    except BaseException:
+        for path, size in sizes.items():
+            with open(path, 'r+') as fh:
+                fh.truncate(size)
+        raise
+
+
+def summary_path_for(output_path: str) -> str:
+    """`predictions.csv` / `predictions.store` -> `predictions_summary.json`."""
+    return str(Path(output_path).with_suffix('')) + '_summary.json'
+
+
+def canonical_param_value(value: Any) -> Any:
+    """Parameter value in a form that survives a CSV or store round trip.
+
+    Whole floats become ints (`10.0` -> `10`), NaN becomes None and NumPy
+    scalars become Python values; booleans and strings are kept.
+    """
+    if value is None or isinstance(value, str):
+        return value
+    if isinstance(value, (bool, np.bool_)):
+        return bool(value)
+    if isinstance(value, (int, float, np.integer, np.floating)):
+        value = float(value)
+        if np.isnan(value):
+            return None
+        return int(value) if value.is_integer() else value
+    return value
 
-def filter_new_combinations(param_combinations: List[Dict[str, Any]],
-                           existing_df: pd.DataFrame,
-                           detector_name: str,
-                           record_ids: List[str]) -> List[Dict[str, Any]]:
-    """Filter out parameter combinations that already exist in the dataset."""
-    if existing_df.empty:
-        return param_combinations
 
-    # Get parameter column names for this detector
-    param_cols = get_result_columns(detector_name)
+def config_key(params: Dict[str, Any]) -> str:
+    """Stable hash of a parameter combination (canonical typed values, sorted names)."""
+    payload = json.dumps({name: canonical_param_value(params[name]) for name in sorted(params)})
+    return hashlib.sha1(payload.encode()).hexdigest()[:16]
 
-    # Get unique combinations from existing data
-    existing_combos = existing_df[param_cols].drop_duplicates()
 
-    # Create set of existing tuples for fast lookup
-    existing_set = set()
-    for _, row in existing_combos.iterrows():
-        combo_tuple = tuple(row[col] for col in param_cols)
-        existing_set.add(combo_tuple)
+def existing_prediction_cells(file_path: str) -> pd.DataFrame:
+    """Scalar columns (record_id, parameters, ...) of existing predictions, if any.
 
-    # Filter out existing combinations
-    new_combinations = []
-    for params in param_combinations:
-        combo_tuple = tuple(params[col] for col in param_cols)
-        if combo_tuple not in existing_set:
-            new_combinations.append(params)
+    Reads a predictions store (with its appended parts) or a CSV without its
+    list columns, so nothing per detection is parsed.
+    """
+    if is_predictions_store(file_path):
+        store = PredictionsStore(file_path)
+        df = pd.concat([part.table for part in [store] + store.parts], ignore_index=True)
+    elif Path(file_path).is_file():
+        header = pd.read_csv(file_path, nrows=0).columns
+        df = pd.read_csv(file_path, usecols=[c for c in header if c not in LIST_COLUMNS],
+                         dtype={'record_id': str})
+    else:
+        return pd.DataFrame()
+    print(f"Found {len(df)} existing predictions in {file_path}")
+    return df
+
+
+def missing_cells(param_combinations: List[Dict[str, Any]],
+                  existing_df: pd.DataFrame,
+                  detector_name: str,
+                  record_ids: List[str]) -> List[Tuple[List[int], List[str]]]:
+    """(record, combination) cells absent from existing predictions.
+
+    Cells are matched on (record_id, `config_key`), so values read back from
+    a CSV (`10.0`, NaN) match the grid's (`10`, None). Returns
+    `[(combination indices, record ids)]`, records grouped by the
+    combinations they miss (e.g. new records miss the whole grid, existing
+    ones only the new combinations).
+    """
+    if existing_df.empty:
+        return [(list(range(len(param_combinations))), [str(rid) for rid in record_ids])]
+
+    # Get parameter column names for this detector (raw predictions have no min_gap_samples)
+    param_cols = [col for col in get_result_columns(detector_name) if col in param_combinations[0]]
+    stored_cols = [col for col in get_result_columns(detector_name) if col in existing_df.columns]
+    if param_cols != stored_cols:
+        raise ValueError(
+            f"Existing predictions use parameter columns {stored_cols} but the new grid uses {param_cols}. "
+            "Raw (lazy min_gap) and materialized min_gap predictions cannot be mixed in one file."
+        )
+
+    existing_combos = existing_df[['record_id'] + param_cols].drop_duplicates()
+    existing = set(zip(existing_combos['record_id'].astype(str),
+                       map(config_key, existing_combos[param_cols].to_dict('records'))))
+    keys = [config_key({col: params[col] for col in param_cols}) for params in param_combinations]
+
+    groups: Dict[tuple, List[str]] = {}
+    for rid in map(str, record_ids):
+        missing = tuple(i for i, key in enumerate(keys) if (rid, key) not in existing)
+        if missing:
+            groups.setdefault(missing, []).append(rid)
 
-    skipped = len(param_combinations) - len(new_combinations)
-    print(f"Skipping {skipped} existing combinations, {len(new_combinations)} new combinations to process")
+    n_missing = sum(len(m) * len(rids) for m, rids in groups.items())
+    print(f"Skipping {len(record_ids) * len(keys) - n_missing} existing (record, combination) cells, "
+          f"{n_missing} to process")
+    return [(list(m), rids) for m, rids in groups.items()]
 
-    return new_combinations
+
+def combine_parity_reports(reports: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """One `dtype_parity_report` from the reports of several batches."""
+    combinations = []
+    for report in reports:
+        combinations += [c for c in report['differing_combinations'] if c not in combinations]
+    return {
+        'n_predictions': sum(r['n_predictions'] for r in reports),
+        'n_differing': sum(r['n_differing'] for r in reports),
+        'differing_records': [rid for r in reports for rid in r['differing_records']],
+        'differing_combinations': combinations,
+        'max_detection_count_diff': max((r['max_detection_count_diff'] for r in reports), default=0),
+    }
 
 
 def generate_predictions_dataset(data_path: str, output_path: str,
@@ -320,11 +881,23 @@ def generate_predictions_dataset(data_path: str, output_path: str,
                                sample_rate: int = 250,
                                n_jobs: int = -1, max_files: int = None, max_samples: int = None,
                                custom_param_grid: Dict[str, List[Any]] = None,
-                               append_mode: bool = False) -> None:
+                               append_mode: bool = False,
+                               group_min_gap: bool = True,
+                               raw_detections: bool = True,
+                               preprocess_cache_dir: str = PREPROCESS_CACHE_DEFAULT,
+                               vectorized: bool = True,
+                               engine: str = 'skmultiflow',
+                               use_equivalences: bool = True,
+                               fork_sweeps: bool = False,
+                               signal_dtype: str = 'float64',
+                               dtype_parity: bool = False,
+                               output_format: str = 'csv',
+                               resume: bool = False) -> None:
     """Generate intermediate predictions dataset.
 
     Args:
-        data_path: Path to tidy CSV with id column
+        data_path: Path to tidy CSV with id column, or a binary dataset directory
+            (`record_store`)
         output_path: Output CSV path for predictions
         detector_name: Name of detector ('adwin', 'page_hinkley', 'kswin', 'hddm_a', 'hddm_w')
         sample_rate: Sampling rate
@@ -332,25 +905,73 @@ def generate_predictions_dataset(data_path: str, output_path: str,
         max_files: Limit number of files (for testing)
         max_samples: Limit samples per file (for testing)
         custom_param_grid: Custom parameter grid (if None, use default)
-        append_mode: If True, load existing predictions and only generate new combinations
+        append_mode: If True, only generate the (record, combination) cells missing
+            from the existing predictions and add them without rewriting the file
+        group_min_gap: If True, run each detector configuration once and derive all
+            `min_gap_samples` variants from the raw detections
+        raw_detections: If True, store raw (unfiltered) detections once per
+            (detector params, ma_window) and leave `min_gap_samples` to
+            `evaluate_predictions`; the grid's min_gap values are recorded in the
+            summary as the default post-filter grid. If False, one row per
+            `min_gap_samples` value is materialized (legacy layout).
+        preprocess_cache_dir: Directory of the cross-detector preprocessed signal
+            cache (None disables caching)
+        vectorized: If True, all configs sharing an ma_window run in one pass
+            (multi-configuration engines or a generic `DetectorBank`)
+        engine: Detector implementation (see `detectors.ENGINES`)
+        use_equivalences: If True, run one representative per class of
+            behaviourally identical combinations (`EQUIVALENCE_RULES`) and skip
+            invalid ones
+        fork_sweeps: If True (with `vectorized`), Page-Hinkley and ADWIN configs
+            share detector state until their decisions diverge
+        signal_dtype: dtype of the preprocessed signals and their cache
+            ('float64' or 'float32'); detectors compute in float64 either way
+        dtype_parity: If True, also run the grid with the other signal dtype and
+            report (and store in the summary) which detections differ
+        output_format: 'csv' (CSV + JSONL with list columns) or 'store' (binary
+            predictions store directory at `output_path`, see
+            `src/predictions_store.py`)
+        resume: If True, keep the shards of an interrupted run with the same
+            settings (`<output stem>.shards`, see `src/prediction_shards.py`) and
+            only run the records missing from its manifest
     """
+    if signal_dtype not in SIGNAL_DTYPES:
+        raise ValueError(f"signal_dtype must be one of {SIGNAL_DTYPES}, got {signal_dtype!r}")
 
     # Load existing predictions if in append mode
+    if output_format not in ('csv', 'store'):
+        raise ValueError(f"output_format must be 'csv' or 'store', got {output_format!r}")
     existing_df = pd.DataFrame()
     if append_mode:
-        existing_df = load_existing_predictions(output_path)
+        existing_df = existing_prediction_cells(output_path)
 
     # Load data
     print(f"Loading data from {data_path}")
-    df, _ = load_dataset(data_path, sample_rate=sample_rate)
+    store, store_dir = None, None
+    if is_record_store(data_path):
+        # Binary dataset directory: memory-mapped as is, nothing to parse
+        store = RecordStore(data_path).select(max_records=max_files)
+        unique_ids = np.asarray(store.ids, dtype=object)
+        catalog = store.catalog
+    else:
+        # With max_files only those records are read (via the dataset catalog)
+        df, _ = load_dataset(data_path, sample_rate=sample_rate, max_records=max_files)
 
-    if 'id' not in df.columns:
-        raise ValueError("Dataset must contain 'id' column for per-file processing")
+        if 'id' not in df.columns:
+            raise ValueError("Dataset must contain 'id' column for per-file processing")
+
+        unique_ids = df['id'].unique()
+        if max_files:
+            unique_ids = unique_ids[:max_files]
+        catalog = select_records(get_catalog(data_path), record_ids=unique_ids)
+
+    dataset_hash = dataset_fingerprint(data_path)
+    preprocess_cache = None
+    if preprocess_cache_dir:
+        preprocess_cache = PreprocessCache(preprocess_cache_dir, dataset_hash, signal_dtype)
+        print(f"Preprocessed signal cache: {preprocess_cache.root}")
 
-    # Group by ID
-    unique_ids = df['id'].unique()
     if max_files:
-        unique_ids = unique_ids[:max_files]
         print(f"Limited to {max_files} files for testing")
 
     print(f"Found {len(unique_ids)} unique record IDs")
@@ -358,82 +979,149 @@ def generate_predictions_dataset(data_path: str, output_path: str,
 
     # Create parameter combinations
     param_grid = create_param_grid(detector_name, custom_param_grid)
-    param_names = list(param_grid.keys())
+    post_filters = {}
+    detector_grid = dict(param_grid)
+    if raw_detections:
+        post_filters['min_gap_samples'] = detector_grid.pop('min_gap_samples')
+    param_names = list(detector_grid.keys())
     param_combinations = [
         dict(zip(param_names, values))
-        for values in itertools.product(*param_grid.values())
+        for values in itertools.product(*detector_grid.values())
     ]
 
-    # Filter out existing combinations if in append mode
-    if append_mode:
-        param_combinations = filter_new_combinations(param_combinations, existing_df, detector_name, unique_ids.tolist())
-
-        if len(param_combinations) == 0:
-            print("No new combinations to process. All requested parameters already exist.")
-            return
+    # Only the (record, combination) cells missing from the existing
+    # predictions are run (all of them outside append mode), in batches of
+    # records missing the same combinations
+    batches = [([param_combinations[i] for i in missing], record_ids)
+               for missing, record_ids in missing_cells(param_combinations, existing_df, detector_name,
+                                                        unique_ids.tolist())]
+    if not batches:
+        print("No new (record, combination) cells to process. All requested predictions already exist.")
+        return
 
     print(f"Testing {len(param_combinations)} parameter combinations per file")
-    print(f"Total predictions to generate: {len(unique_ids)} files × {len(param_combinations)} params = {len(unique_ids) * len(param_combinations):,}")
-
-    start_time = time.time()
-
-    # Process files in parallel
-    if n_jobs == 1:
-        # Sequential processing
-        all_results = []
-        for record_id in unique_ids:
-            record_data = df[df['id'] == record_id].copy()
-            record_data = record_data.reset_index(drop=True)
-            results = process_single_file_predictions(
-                record_id, record_data, param_combinations, detector_name, sample_rate, max_samples
-            )
-            all_results.extend(results)
+    if existing_df.empty:
+        print(f"Total predictions to generate: {len(unique_ids)} files × {len(param_combinations)} params = {len(unique_ids) * len(param_combinations):,}")
     else:
-        # Parallel processing
-        print("Starting parallel prediction generation...")
-
-        def process_record(record_id):
-            record_data = df[df['id'] == record_id].copy()
-            record_data = record_data.reset_index(drop=True)
-            return process_single_file_predictions(
-                record_id, record_data, param_combinations, detector_name, sample_rate, max_samples
-            )
-
-        parallel_results = Parallel(n_jobs=n_jobs)(
-            delayed(process_record)(record_id) for record_id in unique_ids
-        )
+        for combos, record_ids in batches:
+            print(f"  {len(record_ids)} files × {len(combos)} params = {len(record_ids) * len(combos):,} new predictions")
+
+    # Cost planning from the catalog (record lengths, capped by max_samples)
+    record_cost = {rid: min(int(n), max_samples) if max_samples else int(n)
+                   for rid, n in zip(catalog['id'], catalog['n_samples'])}
+    total_samples = sum(record_cost.values())
+    print(f"Planned work: {total_samples:,} samples × {len(param_combinations)} combinations "
+          f"(largest record: {max(record_cost.values(), default=0):,} samples, "
+          f"{int(catalog['n_regime_changes'].sum())} regime changes)")
+
+    # Every completed record is written to a shard right away; a unit is a
+    # record under a batch's grid key (what determines its detections)
+    shards = PredictionShards(shards_dir_for(output_path))
+    settings = {
+        'dataset': dataset_hash, 'detector': detector_name, 'sample_rate': sample_rate,
+        'max_samples': max_samples, 'group_min_gap': group_min_gap, 'vectorized': vectorized,
+        'engine': engine, 'use_equivalences': use_equivalences, 'fork_sweeps': fork_sweeps,
+        'signal_dtype': signal_dtype,
+    }
+    if not resume and shards.manifest_path.exists():
+        print(f"Discarding shards of a previous run in {shards.directory} (use --resume to continue it)")
+        shards.clear()
 
-        # Flatten results
-        all_results = []
-        for results in parallel_results:
-            all_results.extend(results)
+    elapsed_time = 0.0
 
-    elapsed_time = time.time() - start_time
+    # Records are read from a memory-mapped store (CSV input is converted to a
+    # temporary one): workers receive the store (pickled as its directory)
+    # and a record index, and slice their rows by offset
+    if store is None:
+        store_dir = tempfile.mkdtemp(prefix='records_')
+    try:
+        if store is None:
+            store = RecordStore.from_dataframe(df[df['id'].isin(unique_ids)], store_dir)
+            del df
+        def task_args(cache, dtype):
+            return (detector_name, sample_rate, max_samples, group_min_gap, cache,
+                    vectorized, engine, use_equivalences, fork_sweeps, dtype)
+
+        index = {str(rid): k for k, rid in enumerate(store.ids)}
+        # Parity runs of detectors using the global RNG repeat the same draws
+        rng_seed = (0 if dtype_parity and canonical_detector_name(detector_name) in GLOBAL_RNG_DETECTORS
+                    else None)
+        completed_batches = []
+        parity_reports = []
+        for combos, record_ids in batches:
+            key = grid_key(settings, combos)
+            done = shards.completed(key) if resume else {}
+            if resume:
+                print(f"Resuming: {sum(rid in done for rid in record_ids)}/{len(record_ids)} records "
+                      f"already in {shards.directory}")
+            records = [index[rid] for rid in record_ids]
+            pending = [k for k, rid in zip(records, record_ids) if rid not in done]
+            start_time = time.time()
+            # Only the parity check needs the results in memory
+            compact_results = {}
+            for k, compact in _predict_store(store, combos, task_args(preprocess_cache, signal_dtype),
+                                             n_jobs, record_cost, rng_seed, records=pending):
+                shards.write(compact, key)
+                if dtype_parity:
+                    compact_results[k] = compact
+            elapsed_time += time.time() - start_time
+            completed = shards.completed(key)
+            entries = [completed[rid] for rid in record_ids]
+            completed_batches.append((combos, entries))
+
+            if dtype_parity:
+                # Same grid with the other signal dtype; float64 is the reference
+                other_dtype = 'float32' if signal_dtype == 'float64' else 'float64'
+                print(f"\nParity check: rerunning with {other_dtype} signals...")
+                other_cache = (PreprocessCache(preprocess_cache_dir, dataset_hash, other_dtype)
+                               if preprocess_cache is not None else None)
+                other_results = _collect(len(store), _predict_store(store, combos,
+                                                                    task_args(other_cache, other_dtype),
+                                                                    n_jobs, record_cost, rng_seed,
+                                                                    records=records))
+                other_results = [other_results[k] for k in records]
+                own_results = [compact_results[k] if k in compact_results else shards.read(entry)
+                               for k, entry in zip(records, entries)]
+                reference, candidate = ((own_results, other_results) if signal_dtype == 'float64'
+                                        else (other_results, own_results))
+                parity_reports.append(dtype_parity_report(reference, candidate, combos))
+    finally:
+        if store_dir:
+            shutil.rmtree(store_dir, ignore_errors=True)
+
+    parity = None
+    if dtype_parity:
+        parity = combine_parity_reports(parity_reports)
+        print(f"Parity float32 vs float64 ({detector_name}): {parity['n_differing']}/{parity['n_predictions']} "
+              f"predictions differ in {len(parity['differing_records'])} records "
+              f"(max detection count diff: {parity['max_detection_count_diff']})")
+
+    n_new = sum(len(entries) * len(combos) for combos, entries in completed_batches)
+    error_count = sum(entry['n_errors'] for _, entries in completed_batches for entry in entries)
     print(f"\nPrediction generation completed in {elapsed_time:.1f}s")
-    print(f"Generated {len(all_results):,} new predictions")
-
-    # Convert to DataFrame
-    new_results_df = pd.DataFrame(all_results)
-
-    # Merge with existing data if in append mode
-    if append_mode and not existing_df.empty:
-        print(f"Merging {len(new_results_df)} new predictions with {len(existing_df)} existing predictions")
-        results_df = pd.concat([existing_df, new_results_df], ignore_index=True)
-        print(f"Total predictions after merge: {len(results_df)}")
+    print(f"Generated {n_new:,} new predictions")
+
+    # New predictions are added next to the existing ones (appended CSV/JSONL
+    # rows, new store parts); existing data is never rewritten
+    appending = not existing_df.empty
+    n_total = len(existing_df) + n_new
+    if output_format == 'store':
+        for combos, entries in completed_batches:
+            # Straight from the compact results: no per-row lists are built
+            parts = predictions_store_parts([shards.read(e) for e in entries], combos, sample_rate)
+            if appending:
+                PredictionsStore.append(output_path, **parts)
+            else:
+                PredictionsStore.write(output_path, **parts)
+        print(f"\nResults {'appended' if appending else 'saved'} to: {output_path} (predictions store)")
     else:
-        results_df = new_results_df
-
-    # Save as CSV
-    csv_path = output_path
-    results_df.to_csv(csv_path, index=False)
-    print(f"\nResults saved to: {csv_path}")
-
-    # Also save as JSON Lines for easier inspection
-    jsonl_path = output_path.replace('.csv', '.jsonl')
-    with open(jsonl_path, 'w') as f:
-        for result in all_results:
-            f.write(json.dumps(result) + '\n')
-    print(f"JSONL format saved to: {jsonl_path}")
+        jsonl_path = output_path.replace('.csv', '.jsonl')
+        for combos, entries in completed_batches:
+            merge_shards_csv(shards, entries, combos, sample_rate, output_path, jsonl_path, append=appending)
+        print(f"\nResults {'appended' if appending else 'saved'} to: {output_path}")
+        print(f"JSONL format {'appended' if appending else 'saved'} to: {jsonl_path}")
+    if appending:
+        print(f"Total predictions after append: {n_total}")
 
     # Save summary statistics
     # Derive dataset name for metadata
@@ -445,21 +1133,35 @@ def generate_predictions_dataset(data_path: str, output_path: str,
     summary = {
         'dataset': dataset_name,
         'total_files': len(unique_ids),
-        'new_param_combinations': len(param_combinations),
-        'new_predictions': len(all_results),
-        'total_predictions_in_file': len(results_df),
+        'new_param_combinations': len({config_key(p) for combos, _ in completed_batches for p in combos}),
+        'new_records': len({e['record_id'] for _, entries in completed_batches for e in entries}),
+        'new_predictions': n_new,
+        'total_predictions_in_file': n_total,
+        'output_format': output_format,
         'processing_time_seconds': elapsed_time,
         'param_grid': param_grid,
         'sample_rate': sample_rate,
         'append_mode': append_mode,
-        'error_count': sum(1 for r in all_results if 'error' in r),
-        'avg_processing_time_per_prediction': elapsed_time / len(all_results) if all_results else 0
+        'group_min_gap': group_min_gap,
+        'vectorized': vectorized,
+        'use_equivalences': use_equivalences,
+        'fork_sweeps': fork_sweeps,
+        'engine': engine,
+        'signal_dtype': signal_dtype,
+        'raw_detections': raw_detections,
+        'post_filters': post_filters,
+        'error_count': error_count,
+        'avg_processing_time_per_prediction': elapsed_time / n_new if n_new else 0
     }
+    if parity is not None:
+        summary['dtype_parity'] = parity
 
-    summary_path = output_path.replace('.csv', '_summary.json')
+    summary_path = summary_path_for(output_path)
     with open(summary_path, 'w') as f:
         json.dump(summary, f, indent=2)
     print(f"Summary saved to: {summary_path}")
+    # Outputs are complete: the shards are no longer needed
+    shards.clear()
 
 
 def main():
@@ -474,9 +1176,13 @@ Examples:
     # Generate for Page-Hinkley
     python -m src.generate_predictions --detector page_hinkley --data data.csv --output results/<dataset>/page_hinkley/predictions.csv
 
-  # Append new min_gap values to existing predictions
+  # New min_gap values need no detector runs: predictions store raw detections
+  python -m src.evaluate_predictions --predictions results/adwin/predictions.csv ... \\
+      --min-gap 100 200 300 400 500 750
+
+  # Legacy layout with one row per min_gap value
   python -m src.generate_predictions --detector adwin --data data.csv --output results/adwin/predictions.csv \\
-      --append --min-gap 100 200 300 400 500 750
+      --materialize-min-gap --append --min-gap 100 200 300 400 500 750
 
   # Custom full grid for Page-Hinkley
   python -m src.generate_predictions --detector page_hinkley --data data.csv --output results/page_hinkley/predictions.csv \\
@@ -486,8 +1192,12 @@ Examples:
     parser.add_argument('--detector', required=True,
                        choices=['adwin', 'page_hinkley', 'kswin', 'hddm_a', 'hddm_w'],
                        help='Detector type to use')
-    parser.add_argument('--data', required=True, help='Path to tidy CSV with id column')
-    parser.add_argument('--output', required=True, help='Output CSV path for predictions')
+    parser.add_argument('--data', required=True, help='Path to tidy CSV with id column, or a binary dataset directory (src.record_store)')
+    parser.add_argument('--output', required=True,
+                       help='Output CSV path for predictions (directory with --output-format store)')
+    parser.add_argument('--output-format', default='csv', choices=['csv', 'store'],
+                       help='csv: CSV + JSONL with list columns; store: binary predictions store '
+                            '(src.predictions_store), much faster to write and to evaluate')
     parser.add_argument('--sample-rate', type=int, default=250, help='Sampling rate')
     parser.add_argument('--n-jobs', type=int, default=-1, help='Number of parallel jobs')
     parser.add_argument('--max-files', type=int, default=None, help='Limit number of files (for testing)')
@@ -495,7 +1205,37 @@ Examples:
 
     # Append mode
     parser.add_argument('--append', action='store_true',
-                       help='Append mode: load existing predictions and only generate new combinations')
+                       help='Append mode: only generate the (record, combination) cells missing from the existing '
+                            'predictions (new records and/or new combinations) and append them without rewriting')
+    parser.add_argument('--resume', action='store_true',
+                       help='Continue an interrupted run: keep the per-record shards written with the same '
+                            'settings (<output stem>.shards) and only process the missing records')
+
+    parser.add_argument('--no-min-gap-grouping', action='store_true',
+                       help='Run the detector once per grid point instead of once per (detector params, ma_window) group')
+    parser.add_argument('--preprocess-cache-dir', default=PREPROCESS_CACHE_DEFAULT,
+                       help='Directory for the cross-detector cache of smoothed signals')
+    parser.add_argument('--no-preprocess-cache', action='store_true',
+                       help='Recompute the moving average for every configuration instead of caching it')
+    parser.add_argument('--no-equivalences', action='store_true',
+                       help='Run every combination even when the detector ignores the axis it differs in '
+                            '(e.g. warning_confidence for HDDM_A/HDDM_W)')
+    parser.add_argument('--no-vectorized', action='store_true',
+                       help='Run every configuration separately instead of one pass per ma_window (multi-config engines / DetectorBank)')
+    parser.add_argument('--fork-sweeps', action='store_true',
+                       help='Page-Hinkley/ADWIN: share detector state between configs until their decisions '
+                            'diverge (faster on grids with few detections)')
+    parser.add_argument('--engine', type=str, default='skmultiflow', choices=ENGINES,
+                       help="Detector implementation: skmultiflow, native (in-repo ADWIN), incremental "
+                            "(in-repo KSWIN) or reference (in-repo engine checked against skmultiflow)")
+    parser.add_argument('--signal-dtype', default='float64', choices=SIGNAL_DTYPES,
+                       help='dtype of the preprocessed signals and their cache (float32 halves memory and '
+                            'cache size; detections may differ slightly from float64)')
+    parser.add_argument('--dtype-parity', action='store_true',
+                       help='Also run the grid with the other signal dtype and report which detections differ')
+    parser.add_argument('--materialize-min-gap', action='store_true',
+                       help='Write one row per min_gap_samples value instead of raw detections '
+                            '(by default min_gap is applied lazily by evaluate_predictions)')
 
     # Custom parameter grid - Common parameters
     parser.add_argument('--ma-window', type=int, nargs='+', default=None,
@@ -602,7 +1342,18 @@ Examples:
         max_files=args.max_files,
         max_samples=args.max_samples,
         custom_param_grid=custom_param_grid,
-        append_mode=args.append
+        append_mode=args.append,
+        group_min_gap=not args.no_min_gap_grouping,
+        raw_detections=not args.materialize_min_gap,
+        preprocess_cache_dir=None if args.no_preprocess_cache else args.preprocess_cache_dir,
+        vectorized=not args.no_vectorized,
+        use_equivalences=not args.no_equivalences,
+        fork_sweeps=args.fork_sweeps,
+        engine=args.engine,
+        signal_dtype=args.signal_dtype,
+        dtype_parity=args.dtype_parity,
+        output_format=args.output_format,
+        resume=args.resume
     )
 
 
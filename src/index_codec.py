@@ -0,0 +1,135 @@
+"""Compact encoding of sample-index streams (detections, regime changes).
+
+Index lists are increasing sample positions, so consecutive differences are
+small: each list is stored as its first value followed by the deltas, zigzag
+mapped (a negative delta, i.e. an unsorted list, still round-trips) and
+written as LEB128 varints (7 bits per byte, high bit set on all but the last
+byte of a value). A detection every few seconds at 250 Hz costs 2 bytes
+instead of 4 (int32) or ~16 characters as text with its time in seconds.
+Times are not stored; they are `index / sample_rate` on read.
+
+Both directions are vectorized with NumPy. `encode_ragged`/`decode_ragged`
+handle many lists at once given their offsets (the predictions store keeps
+those separately); `IndexLogWriter`/`read_index_log` append to and read a
+single growing stream, e.g. the detections of a live `StreamProcessor`.
+"""
+from __future__ import annotations
+from pathlib import Path
+from typing import Iterable
+
+import numpy as np
+
+
+def _zigzag(deltas: np.ndarray) -> np.ndarray:
+    deltas = np.asarray(deltas, dtype=np.int64)
+    return ((deltas << 1) ^ (deltas >> 63)).view(np.uint64)
+
+
+def _unzigzag(codes: np.ndarray) -> np.ndarray:
+    codes = np.asarray(codes, dtype=np.uint64)
+    return (codes >> np.uint64(1)).view(np.int64) ^ -(codes & np.uint64(1)).view(np.int64)
+
+
+def encode_varint(values: np.ndarray) -> np.ndarray:
+    """LEB128 bytes (uint8 array) of non-negative integers."""
+    values = np.asarray(values, dtype=np.uint64).reshape(-1)
+    nbytes = np.ones(values.size, dtype=np.int64)
+    rest = values >> np.uint64(7)
+    while rest.any():
+        nbytes += rest > 0
+        rest >>= np.uint64(7)
+    owner = np.repeat(np.arange(values.size), nbytes)
+    byte_pos = np.arange(owner.size) - np.repeat(np.cumsum(nbytes) - nbytes, nbytes)
+    out = ((values[owner] >> (7 * byte_pos).astype(np.uint64)) & np.uint64(0x7F)).astype(np.uint8)
+    out[byte_pos < nbytes[owner] - 1] |= 0x80
+    return out
+
+
+def decode_varint(buf) -> np.ndarray:
+    """Integers (uint64) of a LEB128 byte stream."""
+    buf = np.frombuffer(buf, dtype=np.uint8) if isinstance(buf, (bytes, bytearray)) else np.asarray(buf, np.uint8)
+    if buf.size == 0:
+        return np.empty(0, dtype=np.uint64)
+    if buf[-1] & 0x80:
+        raise ValueError("truncated varint stream")
+    ends = np.flatnonzero(buf < 0x80)
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    byte_pos = np.arange(buf.size) - np.repeat(starts, ends - starts + 1)
+    chunks = (buf & 0x7F).astype(np.uint64) << (7 * byte_pos).astype(np.uint64)
+    return np.add.reduceat(chunks, starts)
+
+
+def encode_ragged(values: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+    """Delta + zigzag + varint bytes of the lists `values[offsets[i]:offsets[i + 1]]`.
+
+    Each list's deltas restart from 0, so list `i` decodes independently of
+    the others; `offsets` itself is not part of the stream.
+    """
+    values = np.asarray(values, dtype=np.int64)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    deltas = np.diff(values, prepend=0)
+    starts = offsets[:-1][offsets[:-1] < offsets[1:]]
+    deltas[starts] = values[starts]
+    return encode_varint(_zigzag(deltas))
+
+
+def decode_ragged(buf, offsets: np.ndarray) -> np.ndarray:
+    """Inverse of `encode_ragged`: the concatenated int64 values of all lists."""
+    offsets = np.asarray(offsets, dtype=np.int64)
+    deltas = _unzigzag(decode_varint(buf))
+    if deltas.size != offsets[-1] - offsets[0]:
+        raise ValueError(f"stream holds {deltas.size} values, offsets expect {offsets[-1] - offsets[0]}")
+    totals = np.cumsum(deltas)
+    counts = np.diff(offsets)
+    # Running sum up to (excluding) each list's first value
+    before = np.concatenate(([0], totals))[offsets[:-1] - offsets[0]]
+    return totals - np.repeat(before, counts)
+
+
+def encode_indices(indices: Iterable[int]) -> bytes:
+    """Encoded bytes of one index list."""
+    values = np.fromiter(indices, dtype=np.int64)
+    return encode_ragged(values, np.array([0, values.size])).tobytes()
+
+
+def decode_indices(data: bytes) -> np.ndarray:
+    """int64 indices of one list encoded by `encode_indices`."""
+    return np.cumsum(_unzigzag(decode_varint(data)))
+
+
+class IndexLogWriter:
+    """Append-only event log of sample indices, one delta-varint stream per file.
+
+    `append` takes the indices of one chunk (e.g. the return value of
+    `StreamProcessor.process`) and continues the delta from the last index
+    written, so the file grows by about 2 bytes per event.
+    """
+
+    def __init__(self, path: str | Path, append: bool = False):
+        self.path = Path(path)
+        self._last = int(read_index_log(self.path)[-1:].sum()) if append and self.path.exists() else 0
+        self._fh = open(self.path, 'ab' if append else 'wb')
+
+    def append(self, indices) -> None:
+        values = np.asarray(indices, dtype=np.int64).reshape(-1)
+        if values.size == 0:
+            return
+        deltas = np.diff(values, prepend=self._last)
+        self._fh.write(encode_varint(_zigzag(deltas)).tobytes())
+        self._fh.flush()
+        self._last = int(values[-1])
+
+    def close(self) -> None:
+        self._fh.close()
+
+    def __enter__(self) -> 'IndexLogWriter':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def read_index_log(path: str | Path) -> np.ndarray:
+    """All indices (int64) written to an `IndexLogWriter` file."""
+    with open(path, 'rb') as fh:
+        return decode_indices(fh.read())
@@ -0,0 +1,340 @@
+"""In-repo detector engines that do not depend on scikit-multiflow.
+
+They are selected through `build_detector(name, engine=...)` and reproduce the
+detections of the scikit-multiflow classes the pipeline has always used; the
+`'reference'` engine runs both side by side and fails on the first divergence.
+"""
+from __future__ import annotations
+import warnings
+from functools import lru_cache
+
+import numpy as np
+from sortedcontainers import SortedList
+
+
+class ADWIN:
+    """ADWIN (Bifet & Gavaldà) with an array-backed exponential histogram.
+
+    Bucket row `r` holds up to `MAX_BUCKETS + 1` buckets of `2**r` samples in
+    preallocated fixed-size rows (oldest bucket first; plain lists, which are
+    cheaper than NumPy scalars for the per-sample updates), and the cut check
+    every `clock` samples is a vectorized NumPy scan over all bucket boundaries
+    instead of a walk over a linked list.
+
+    Detections match `skmultiflow.drift_detection.ADWIN` sample for sample: the
+    arithmetic follows the same operation order, and the reference's quirks are
+    kept (the newest bucket of each row is not a cut candidate; a merged bucket
+    keeps only the variance of the newer half plus the merge term).
+
+    As in the reference, `add_element` + `detected_change` are one step; the cut
+    check runs inside `add_element` and `detected_change` reports its result.
+    """
+
+    MAX_BUCKETS = 5
+    MAX_ROWS = 64
+
+    def __init__(self, delta: float = 0.002, clock: int = 32,
+                 min_window_longitude: int = 10, min_window_length: int = 5):
+        self.delta = delta
+        self.clock = clock
+        self.min_window_longitude = min_window_longitude
+        self.min_window_length = min_window_length
+        self.reset()
+
+    def reset(self):
+        self._totals = [[0.0] * (self.MAX_BUCKETS + 1) for _ in range(self.MAX_ROWS)]
+        self._variances = [[0.0] * (self.MAX_BUCKETS + 1) for _ in range(self.MAX_ROWS)]
+        self._counts = [0] * self.MAX_ROWS
+        self._last_row = 0
+        self._width = 0
+        self._total = 0.0
+        self._variance = 0.0
+        self._time = 0
+        self.in_concept_change = False
+        self.n_detections = 0
+
+    @property
+    def width(self) -> int:
+        return self._width
+
+    @property
+    def total(self) -> float:
+        return self._total
+
+    @property
+    def variance(self) -> float:
+        return self._variance / self._width
+
+    @property
+    def estimation(self) -> float:
+        return self._total / self._width if self._width else 0
+
+    def detected_change(self) -> bool:
+        return self.in_concept_change
+
+    def detected_warning_zone(self) -> bool:
+        return False
+
+    def add_element(self, value: float):
+        self._insert(float(value))
+        self._time += 1
+        changed = (self._time % self.clock == 0 and self._width > self.min_window_longitude
+                   and self._cut_window())
+        if changed:
+            self.n_detections += 1
+        self.in_concept_change = changed
+
+    def add_elements(self, values) -> np.ndarray:
+        """Feed a chunk; return the offsets (within the chunk) of detections."""
+        values = np.ascontiguousarray(values, dtype=np.float64)
+        insert = self._insert
+        clock, longitude = self.clock, self.min_window_longitude
+        hits = []
+        for pos, value in enumerate(values.tolist()):
+            insert(value)
+            self._time += 1
+            if self._time % clock == 0 and self._width > longitude and self._cut_window():
+                hits.append(pos)
+        self.n_detections += len(hits)
+        self.in_concept_change = bool(hits) and hits[-1] == values.size - 1
+        return np.asarray(hits, dtype=np.int64)
+
+    def _insert(self, value: float):
+        self._width += 1
+        width = self._width
+        counts = self._counts
+        totals, variances = self._totals, self._variances
+        totals[0][counts[0]] = value
+        variances[0][counts[0]] = 0.0
+        counts[0] += 1
+        if width > 1:
+            diff = value - self._total / (width - 1)
+            self._variance += (width - 1) * diff * diff / width
+        self._total += value
+
+        # Compress: a full row merges its two oldest buckets into the next row
+        row = 0
+        while counts[row] == self.MAX_BUCKETS + 1:
+            nxt = row + 1
+            if nxt > self._last_row:
+                self._last_row = nxt
+            size = 1 << row
+            row_totals, row_variances = totals[row], variances[row]
+            t0, t1 = row_totals[0], row_totals[1]
+            u1, u2 = t0 / size, t1 / size
+            merge_variance = size * size * ((u1 - u2) * (u1 - u2)) / (size + size)
+            totals[nxt][counts[nxt]] = t0 + t1
+            variances[nxt][counts[nxt]] = row_variances[1] + merge_variance
+            counts[nxt] += 1
+            row_totals[:-2] = row_totals[2:]
+            row_variances[:-2] = row_variances[2:]
+            row_totals[-2:] = (0.0, 0.0)
+            row_variances[-2:] = (0.0, 0.0)
+            counts[row] -= 2
+            if counts[nxt] <= self.MAX_BUCKETS:
+                break
+            row = nxt
+
+    def _delete_oldest_bucket(self):
+        last = self._last_row
+        size = 1 << last
+        row_totals, row_variances = self._totals[last], self._variances[last]
+        t0 = row_totals[0]
+        self._width -= size
+        self._total -= t0
+        u1 = t0 / size
+        diff = u1 - self._total / self._width
+        self._variance -= row_variances[0] + size * self._width * diff * diff / (size + self._width)
+        row_totals[:-1] = row_totals[1:]
+        row_variances[:-1] = row_variances[1:]
+        row_totals[-1] = 0.0
+        row_variances[-1] = 0.0
+        self._counts[last] -= 1
+        if self._counts[last] == 0:
+            self._last_row -= 1
+
+    def _cut_exists(self, deltas: np.ndarray) -> np.ndarray:
+        """For each delta: does any split of the current window satisfy the cut test?"""
+        min_len = self.min_window_length
+        rows = range(self._last_row, -1, -1)
+        # Oldest first; the newest bucket of each row is not a candidate
+        bucket_totals = np.array([t for r in rows for t in self._totals[r][:self._counts[r] - 1]])
+        sizes = np.array([1 << r for r in rows for _ in range(self._counts[r] - 1)], dtype=np.int64)
+        if sizes.size == 0:
+            return np.zeros(len(deltas), dtype=bool)
+        n0 = np.cumsum(sizes)
+        n1 = self._width - n0
+        u0 = np.cumsum(bucket_totals)
+        u1 = np.cumsum(np.concatenate(([self._total], -bucket_totals)))[1:]
+
+        n = self._width
+        # Scalar np.log per delta, exactly as the reference evaluates it
+        dd = np.array([np.log(2 * np.log(n) / delta) for delta in deltas])[:, None]
+        v = self._variance / self._width
+        with np.errstate(divide='ignore', invalid='ignore'):
+            abs_value = u0 / n0 - u1 / n1
+            m = (1. / (n0 - min_len + 1)) + (1. / (n1 - min_len + 1))
+            epsilon = np.sqrt(2 * m * v * dd) + 1. * 2 / 3 * dd * m
+            cut = (n1 >= min_len) & (n0 >= min_len) & (np.absolute(abs_value) > epsilon)
+        return cut.any(axis=1)
+
+    def _cut_window(self) -> bool:
+        """Drop the oldest buckets while some split of the window is a cut."""
+        changed = False
+        deltas = np.array([self.delta])
+        while self._width > 0 and self._cut_exists(deltas)[0]:
+            changed = True
+            self._delete_oldest_bucket()
+        return changed
+
+    def copy(self) -> 'ADWIN':
+        """Independent copy of the detector state."""
+        clone = object.__new__(ADWIN)
+        clone.__dict__.update(self.__dict__)
+        clone._totals = [row[:] for row in self._totals]
+        clone._variances = [row[:] for row in self._variances]
+        clone._counts = self._counts[:]
+        return clone
+
+
+@lru_cache(maxsize=None)
+def _ks_decision_table(stat_size: int, alpha: float) -> np.ndarray:
+    """`table[h]`: does KSWIN signal change when the KS distance is h / stat_size?
+
+    For two samples of `stat_size` values, `ks_2samp(..., method='exact')`
+    rounds the statistic to `h / stat_size` with integer `h` and its p-value is
+    a function of `h` alone, so the test reduces to a lookup. Values come from
+    scipy itself (samples built to have distance exactly `h`).
+    """
+    from scipy import stats
+
+    base = np.arange(stat_size, dtype=np.float64)
+    table = np.zeros(stat_size + 1, dtype=bool)
+    with warnings.catch_warnings():
+        # scipy falls back to the asymptotic p-value for large h, as it does
+        # inside skmultiflow.KSWIN
+        warnings.simplefilter('ignore', RuntimeWarning)
+        for h in range(stat_size + 1):
+            st, p_value = stats.ks_2samp(base, base + h, method='exact')[:2]
+            table[h] = p_value <= alpha and st > 0.1
+    return table
+
+
+class KSWIN:
+    """KSWIN (Raab et al.) with an incrementally maintained test window.
+
+    Same detections as `skmultiflow.drift_detection.KSWIN` for the same global
+    NumPy random state: the reference sample is drawn with the same
+    `np.random.choice` call (with replacement, redrawn at every sample, so it
+    cannot be maintained incrementally), while the window is a ring buffer and
+    its last `stat_size` values live in a `SortedList` updated with one insert
+    and one removal per sample. The statistic is computed as an integer count
+    difference and the exact KS p-value comes from a per-(`stat_size`, `alpha`)
+    lookup table instead of a full `ks_2samp` call per sample.
+    """
+
+    def __init__(self, alpha: float = 0.005, window_size: int = 100, stat_size: int = 30):
+        if alpha < 0 or alpha > 1:
+            raise ValueError("Alpha must be between 0 and 1")
+        if window_size < 0:
+            raise ValueError("window_size must be greater than 0")
+        if window_size < stat_size:
+            raise ValueError("stat_size must be smaller than window_size")
+        self.alpha = alpha
+        self.window_size = window_size
+        self.stat_size = stat_size
+        self._decision = _ks_decision_table(stat_size, alpha)
+        self.reset()
+
+    def reset(self):
+        self._buffer = np.zeros(max(self.window_size, 1))
+        self._start = 0
+        self._length = 0
+        self._recent = SortedList()
+        self.change_detected = False
+        self.n = 0
+
+    @property
+    def window(self) -> np.ndarray:
+        """Current window in arrival order (as `skmultiflow.KSWIN.window`)."""
+        positions = (self._start + np.arange(self._length)) % self._buffer.size
+        return self._buffer[positions]
+
+    def detected_change(self) -> bool:
+        return self.change_detected
+
+    def add_element(self, value: float):
+        self.n += 1
+        capacity, s = self._buffer.size, self.stat_size
+        change = False
+        if self._length >= self.window_size:
+            # Drop the oldest sample; it is in the test window only if the
+            # window is not longer than stat_size
+            if self._length <= s:
+                self._recent.remove(self._buffer[self._start])
+            self._start = (self._start + 1) % capacity
+            self._length -= 1
+
+            n_old = self._length - s
+            picks = np.random.choice(n_old, s)  # same draws as choice(window[:-s], s)
+            sample = np.sort(self._buffer[(self._start + picks) % capacity])
+            recent = np.fromiter(self._recent, dtype=np.float64, count=len(self._recent))
+            both = np.concatenate([sample, recent])
+            h = np.abs(np.searchsorted(sample, both, side='right')
+                       - np.searchsorted(recent, both, side='right')).max()
+            if self._decision[h]:
+                change = True
+                self._start = (self._start + self._length - s) % capacity
+                self._length = s
+        self.change_detected = change
+
+        if self._length >= s:
+            self._recent.remove(self._buffer[(self._start + self._length - s) % capacity])
+        self._recent.add(float(value))
+        self._buffer[(self._start + self._length) % capacity] = value
+        self._length += 1
+
+    def add_elements(self, values) -> np.ndarray:
+        """Feed a chunk; return the offsets (within the chunk) of detections."""
+        hits = []
+        add_element = self.add_element
+        for pos, value in enumerate(np.ascontiguousarray(values, dtype=np.float64).tolist()):
+            add_element(value)
+            if self.change_detected:
+                hits.append(pos)
+        return np.asarray(hits, dtype=np.int64)
+
+
+class ReferenceCheckedDetector:
+    """Runs an in-repo engine and its scikit-multiflow reference side by side.
+
+    Every sample goes to both; a `RuntimeError` is raised at the first sample
+    where their change flags differ. Used to validate native engines. The global
+    NumPy random state is replayed for the reference, so randomized detectors
+    (KSWIN) draw the same samples in both.
+    """
+
+    def __init__(self, native, reference):
+        self.native = native
+        self.reference = reference
+        self.n_seen = 0
+        self._change = False
+
+    def add_element(self, value: float):
+        rng_state = np.random.get_state()
+        self.native.add_element(value)
+        native_rng_state = np.random.get_state()
+        np.random.set_state(rng_state)
+        self.reference.add_element(value)
+        np.random.set_state(native_rng_state)
+        native_change = bool(self.native.detected_change())
+        reference_change = bool(self.reference.detected_change())
+        self.n_seen += 1
+        if native_change != reference_change:
+            raise RuntimeError(
+                f"{type(self.native).__name__} diverged from the reference at sample {self.n_seen - 1}: "
+                f"native={native_change}, reference={reference_change}")
+        self._change = native_change
+
+    def detected_change(self) -> bool:
+        return self._change
@@ -0,0 +1,81 @@
+"""Post-processing filters applied to raw detector output.
+
+`min_gap_samples` is not a parameter of the detectors: they emit raw change
+indices and the pipeline suppresses any detection that falls within
+`min_gap_samples` of the previously accepted one. Because the filter never
+feeds back into the detector, every gap value can be derived from a single
+detector run.
+"""
+from __future__ import annotations
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+
+def apply_min_gap(indices, min_gap: Optional[int]) -> np.ndarray:
+    """Suppress detections closer than `min_gap` samples to the last accepted one.
+
+    Mirrors the streaming rule: a detection at `i` is dropped when
+    `i - last_accepted < min_gap`. `None` disables the filter.
+    """
+    idx = np.asarray(indices, dtype=np.int64)
+    if min_gap is None or idx.size == 0:
+        return idx.copy()
+    return apply_min_gaps(idx, [min_gap])[min_gap]
+
+
+def apply_min_gaps(indices, gaps: Iterable[int]) -> Dict[int, np.ndarray]:
+    """Apply several `min_gap` values to the same raw detections in one pass.
+
+    All gaps advance together: at each step every still-active gap jumps to the
+    first detection at or beyond `last_accepted + gap` (via `searchsorted`), so
+    the loop runs at most `max(len(accepted))` times regardless of how many gap
+    values are requested.
+
+    Returns a dict mapping each gap value to its filtered (sorted) index array.
+    """
+    gaps = list(gaps)
+    idx = np.asarray(indices, dtype=np.int64)
+    if idx.size == 0 or not gaps:
+        return {g: idx.copy() for g in gaps}
+
+    # Detection indices are unique, so any gap <= 1 keeps everything
+    gap_arr = np.maximum(np.asarray(gaps, dtype=np.int64), 1)
+    keep = np.zeros((len(gaps), idx.size), dtype=bool)
+    pos = np.zeros(len(gaps), dtype=np.int64)
+    active = np.arange(len(gaps))
+    while active.size:
+        keep[active, pos[active]] = True
+        nxt = np.searchsorted(idx, idx[pos[active]] + gap_arr[active], side='left')
+        pos[active] = nxt
+        active = active[nxt < idx.size]
+
+    return {g: idx[keep[k]] for k, g in enumerate(gaps)}
+
+
+# Registry of post-filters that can be applied lazily at evaluation time.
+# Each entry maps the output column name to a function
+# `(raw_indices, values) -> {value: filtered_indices}`.
+POST_FILTERS = {
+    'min_gap_samples': apply_min_gaps,
+}
+
+
+def expand_post_filters(indices, post_filters: Dict[str, Iterable]) -> List[Tuple[Dict[str, Any], np.ndarray]]:
+    """Apply every combination of post-filter values to one raw detection list.
+
+    Filters are composed in the order given in `post_filters`. Returns a list of
+    `(filter_params, filtered_indices)` tuples, one per combination.
+    """
+    variants = [({}, np.asarray(indices, dtype=np.int64))]
+    for name, values in post_filters.items():
+        if name not in POST_FILTERS:
+            raise ValueError(f"Unknown post-filter: {name}")
+        values = list(values)
+        expanded = []
+        for params, idx in variants:
+            filtered = POST_FILTERS[name](idx, values)
+            for value in values:
+                expanded.append(({**params, name: value}, filtered[value]))
+        variants = expanded
+    return variants
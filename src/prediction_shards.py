@@ -0,0 +1,105 @@
+"""Crash-safe per-record shards of `predict_record` outputs.
+
+`generate_predictions` writes the compact result of every record to its own
+shard as soon as the worker returns it, so a crash or OOM late in a long job
+loses at most the records in flight. A shard belongs to a *unit*: one record
+under one *grid key*, the hash of everything that determines its detections
+(dataset, detector, parameter combinations, engine, dtype, ...). Layout::
+
+    <output stem>.shards/manifest.jsonl           # one line per completed unit
+    <output stem>.shards/<grid key>_<record>.npz   # det_values, det_offsets, gt_indices, processing_time, meta
+
+Shards are written to a temporary file and renamed, and only then recorded in
+the manifest (one flushed + fsynced line), so every manifest entry points to a
+complete shard; a truncated last line from a crash is ignored. `--resume`
+skips the units already in the manifest for the current grid key.
+"""
+from __future__ import annotations
+import hashlib
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import Any, Dict, List
+
+import numpy as np
+
+
+def shards_dir_for(output_path: str) -> str:
+    """`predictions.csv` / `predictions.store` -> `predictions.shards`."""
+    return str(Path(output_path).with_suffix('')) + '.shards'
+
+
+def grid_key(settings: Dict[str, Any], param_combinations: List[Dict[str, Any]]) -> str:
+    """Stable hash of the run settings and parameter combinations (in order)."""
+    payload = json.dumps({'settings': settings, 'combinations': param_combinations},
+                         sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode()).hexdigest()[:16]
+
+
+class PredictionShards:
+    """Shard directory with its manifest of completed (record, grid key) units."""
+
+    def __init__(self, directory: str | Path):
+        self.directory = Path(directory)
+        self.manifest_path = self.directory / 'manifest.jsonl'
+
+    def completed(self, key: str) -> Dict[str, Dict[str, Any]]:
+        """Manifest entries of `key` by record id (units whose shard is on disk)."""
+        entries: Dict[str, Dict[str, Any]] = {}
+        if not self.manifest_path.exists():
+            return entries
+        with open(self.manifest_path) as fh:
+            for line in fh:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # partial line left by a crash
+                if entry.get('grid') == key and (self.directory / entry['shard']).exists():
+                    entries[entry['record_id']] = entry
+        return entries
+
+    def write(self, compact: Dict[str, Any], key: str) -> Dict[str, Any]:
+        """Store one `predict_record` output and record its unit in the manifest."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        record_id = str(compact['record_id'])
+        name = f"{key}_{hashlib.sha1(record_id.encode()).hexdigest()[:16]}.npz"
+        meta = {
+            'record_id': record_id,
+            'n_samples': int(compact['n_samples']),
+            'detector': list(compact['detector']),
+            'errors': {str(i): message for i, message in compact['errors'].items()},
+        }
+        tmp_path = self.directory / f"{name}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as fh:
+            np.savez(fh, det_values=compact['det_values'], det_offsets=compact['det_offsets'],
+                     gt_indices=compact['gt_indices'], processing_time=compact['processing_time'],
+                     meta=np.frombuffer(json.dumps(meta).encode(), dtype=np.uint8))
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp_path, self.directory / name)
+        entry = {'record_id': record_id, 'grid': key, 'shard': name,
+                 'n_detections': int(compact['det_offsets'][-1]), 'n_errors': len(compact['errors'])}
+        with open(self.manifest_path, 'a') as fh:
+            fh.write(json.dumps(entry) + '\n')
+            fh.flush()
+            os.fsync(fh.fileno())
+        return entry
+
+    def read(self, entry: Dict[str, Any]) -> Dict[str, Any]:
+        """The `predict_record` output stored for a manifest entry."""
+        with np.load(self.directory / entry['shard']) as arrays:
+            meta = json.loads(arrays['meta'].tobytes())
+            return {
+                'record_id': meta['record_id'],
+                'n_samples': meta['n_samples'],
+                'gt_indices': arrays['gt_indices'],
+                'detector': meta['detector'],
+                'det_values': arrays['det_values'],
+                'det_offsets': arrays['det_offsets'],
+                'processing_time': arrays['processing_time'],
+                'errors': {int(i): message for i, message in meta['errors'].items()},
+            }
+
+    def clear(self) -> None:
+        shutil.rmtree(self.directory, ignore_errors=True)
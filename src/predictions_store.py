@@ -0,0 +1,413 @@
+"""Binary store of detector predictions (one row per record x parameter combination).
+
+The predictions CSV keeps `gt_indices`, `gt_times`, `det_indices` and
+`det_times` as stringified Python lists, which are slow to write and have to be
+parsed back on every evaluation. A predictions store keeps instead:
+
+- a *table* with the scalar columns of every row (record id, detector,
+  parameters, durations, counts, processing time, error), one array per column;
+  text columns are stored as integer codes plus their categories;
+- the distinct detection lists as one ragged array of sample indices
+  (`det_values`, with `det_offsets[k]:det_offsets[k + 1]` list `k`) and, per
+  row, the list it references (`det_slot[i]`): grid points that produce the
+  same detections for a record (a large `min_gap_samples`, saturated
+  thresholds) share one stored copy;
+- the ground truth as ragged lists shared by all rows of a record
+  (`gt_slot[i]` is the list of row `i`).
+
+The ragged values are written delta + varint encoded by default
+(`encoding='delta-varint'`, see `src/index_codec.py`), about 2 bytes per
+detection, and decoded once when the store is opened; `encoding='int32'`
+keeps them as plain int32 arrays that are memory-mapped instead. Times are
+not stored: `det_times`/`gt_times` are the sample indices divided by
+the store's `sample_rate`, exactly as `generate_predictions` computes them.
+
+Layout::
+
+    <directory>/meta.json          # format, version, sample_rate, n_rows, column order and table schema
+    <directory>/table.npz          # one array per scalar column (text columns as int32 codes)
+    <directory>/det_values.npy     # uint8 varint stream (int32 with encoding='int32')
+    <directory>/det_offsets.npy    # int64, n_unique_detections + 1
+    <directory>/det_slot.npy       # int32, n_rows
+    <directory>/gt_values.npy      # uint8 varint stream (int32 with encoding='int32')
+    <directory>/gt_offsets.npy     # int64, n_slots + 1
+    <directory>/gt_slot.npy        # int32, n_rows
+    <directory>/parts/<nnnn>/      # rows added later by `PredictionsStore.append`, each a store
+
+Conversion and export::
+
+    python -m src.predictions_store --input results/hddm_w/predictions.csv --output results/hddm_w/predictions.store
+    python -m src.predictions_store --input results/hddm_w/predictions.store --csv out.csv --jsonl out.jsonl
+"""
+from __future__ import annotations
+import argparse
+import itertools
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from .index_codec import decode_ragged, encode_ragged
+
+
+STORE_FORMAT = 'ecg-predictions-store'
+STORE_VERSION = 1
+LIST_COLUMNS = ('gt_indices', 'gt_times', 'det_indices', 'det_times')
+ENCODINGS = ('delta-varint', 'int32')
+
+
+def is_predictions_store(path: Optional[str]) -> bool:
+    """True if `path` is a directory written by `PredictionsStore.write`."""
+    if not path or not os.path.isfile(os.path.join(path, 'meta.json')):
+        return False
+    with open(os.path.join(path, 'meta.json')) as fh:
+        return json.load(fh).get('format') == STORE_FORMAT
+
+
+def _ragged(lists: Sequence[Sequence[int]]) -> tuple:
+    """(int64 values, int64 offsets) of a sequence of integer lists."""
+    offsets = np.zeros(len(lists) + 1, dtype=np.int64)
+    np.cumsum([len(values) for values in lists], out=offsets[1:])
+    values = np.fromiter(itertools.chain.from_iterable(lists), dtype=np.int64, count=int(offsets[-1]))
+    return values, offsets
+
+
+def _dedup_ragged(values: np.ndarray, offsets: np.ndarray) -> tuple:
+    """(values, offsets, slot) keeping each distinct list once; `slot[i]` is list `i`'s copy."""
+    values = np.asarray(values, dtype=np.int64)
+    slots: Dict[bytes, int] = {}
+    slot = np.empty(len(offsets) - 1, dtype=np.int32)
+    keep: List[int] = []
+    for i, (a, b) in enumerate(zip(offsets[:-1].tolist(), offsets[1:].tolist())):
+        key = values[a:b].tobytes()
+        if key not in slots:
+            slots[key] = len(keep)
+            keep.append(i)
+        slot[i] = slots[key]
+    counts = np.diff(offsets)[keep]
+    unique_offsets = np.zeros(len(keep) + 1, dtype=np.int64)
+    np.cumsum(counts, out=unique_offsets[1:])
+    starts = np.asarray(offsets, dtype=np.int64)[keep]
+    take = np.repeat(starts - unique_offsets[:-1], counts) + np.arange(unique_offsets[-1])
+    return values[take], unique_offsets, slot
+
+
+def parse_list_column(cells: Sequence[str]) -> List[list]:
+    """Parse stringified number lists (`"[1, 2]"`) as JSON, in one call."""
+    return json.loads('[' + ','.join(cells) + ']')
+
+
+def _encode_table(table: pd.DataFrame) -> tuple:
+    """Column arrays plus schema; text columns become int32 codes + categories."""
+    arrays: Dict[str, np.ndarray] = {}
+    schema: List[Dict[str, Any]] = []
+    for name in table.columns:
+        col = table[name]
+        if not isinstance(col.dtype, pd.CategoricalDtype) and (
+                pd.api.types.is_bool_dtype(col) or pd.api.types.is_numeric_dtype(col)):
+            arrays[name] = col.to_numpy()
+            schema.append({'name': name, 'kind': 'numeric'})
+            continue
+        numeric = pd.to_numeric(col, errors='coerce') if col.dtype == object else None
+        if numeric is not None and numeric.notna().sum() == col.notna().sum():
+            # e.g. a parameter column holding numbers and None
+            arrays[name] = numeric.to_numpy(dtype=float)
+            schema.append({'name': name, 'kind': 'numeric'})
+            continue
+        cat = pd.Categorical(col.where(col.isna(), col.astype(str)))
+        arrays[name] = cat.codes.astype(np.int32)
+        schema.append({'name': name, 'kind': 'categorical', 'categories': [str(c) for c in cat.categories]})
+    return arrays, schema
+
+
+class PredictionsStore:
+    """Reader of a predictions store directory.
+
+    `table` holds the scalar columns (text columns categorical); the list
+    columns of row `i` are `det_indices(i)`, `det_times(i)`, `gt_indices(i)`
+    and `gt_times(i)`. `to_dataframe()` rebuilds the CSV layout.
+
+    Rows added with `append` live in `parts` (stores of their own); the row
+    accessors address this directory's rows only, while `to_dataframe()` and
+    the exports include every part.
+    """
+
+    def __init__(self, directory: str | Path):
+        self.directory = Path(directory)
+        with open(self.directory / 'meta.json') as fh:
+            self.meta = json.load(fh)
+        if self.meta.get('format') != STORE_FORMAT:
+            raise ValueError(f"{self.directory} is not a predictions store ({STORE_FORMAT})")
+        self.sample_rate = self.meta['sample_rate']
+        # Stores written before the encoding option have plain int32 arrays
+        self.encoding = self.meta.get('encoding', 'int32')
+        self.det_offsets = np.load(self.directory / 'det_offsets.npy')
+        self.gt_offsets = np.load(self.directory / 'gt_offsets.npy')
+        self.gt_slot = np.load(self.directory / 'gt_slot.npy')
+        det_slot_path = self.directory / 'det_slot.npy'
+        # Stores written before deduplication keep one detection list per row
+        self.det_slot = (np.load(det_slot_path) if det_slot_path.exists()
+                         else np.arange(len(self.det_offsets) - 1, dtype=np.int32))
+        if self.encoding == 'delta-varint':
+            self.det_values = decode_ragged(np.load(self.directory / 'det_values.npy'), self.det_offsets)
+            self.gt_values = decode_ragged(np.load(self.directory / 'gt_values.npy'), self.gt_offsets)
+        elif self.encoding == 'int32':
+            self.det_values = np.load(self.directory / 'det_values.npy', mmap_mode='r')
+            self.gt_values = np.load(self.directory / 'gt_values.npy')
+        else:
+            raise ValueError(f"unknown encoding {self.encoding!r} in {self.directory}")
+        self._table: Optional[pd.DataFrame] = None
+
+    @classmethod
+    def write(cls, directory: str | Path, table: pd.DataFrame, det_values: np.ndarray,
+              det_offsets: np.ndarray, gt_values: np.ndarray, gt_offsets: np.ndarray,
+              gt_slot: np.ndarray, sample_rate: int, columns: Optional[List[str]] = None,
+              encoding: str = 'delta-varint') -> 'PredictionsStore':
+        """Write a store from its parts.
+
+        `columns` is the full column order of the CSV layout (table columns
+        plus any of `LIST_COLUMNS`); by default the table columns followed by
+        the list columns. `encoding` is one of `ENCODINGS`. `det_values` and
+        `det_offsets` hold one list per row; identical lists are stored once.
+        """
+        if encoding not in ENCODINGS:
+            raise ValueError(f"encoding must be one of {ENCODINGS}, got {encoding!r}")
+        directory = Path(directory)
+        if directory.exists():
+            shutil.rmtree(directory)
+        directory.mkdir(parents=True)
+        det_values = np.asarray(det_values)
+        if det_values.size and (det_values.min() < 0 or det_values.max() >= 2 ** 31):
+            raise ValueError("detection indices do not fit in int32")
+        det_values, det_offsets, det_slot = _dedup_ragged(det_values, np.asarray(det_offsets, dtype=np.int64))
+        gt_offsets = np.asarray(gt_offsets, dtype=np.int64)
+        if encoding == 'delta-varint':
+            np.save(directory / 'det_values.npy', encode_ragged(det_values, det_offsets))
+            np.save(directory / 'gt_values.npy', encode_ragged(gt_values, gt_offsets))
+        else:
+            np.save(directory / 'det_values.npy', det_values.astype(np.int32))
+            np.save(directory / 'gt_values.npy', np.asarray(gt_values).astype(np.int32))
+        np.save(directory / 'det_offsets.npy', det_offsets)
+        np.save(directory / 'det_slot.npy', det_slot)
+        np.save(directory / 'gt_offsets.npy', gt_offsets)
+        np.save(directory / 'gt_slot.npy', np.asarray(gt_slot).astype(np.int32))
+        arrays, schema = _encode_table(table)
+        np.savez(directory / 'table.npz', **arrays)
+        if columns is None:
+            columns = list(table.columns) + list(LIST_COLUMNS)
+        # meta.json last: its presence marks a complete directory
+        with open(directory / 'meta.json', 'w') as fh:
+            json.dump({
+                'format': STORE_FORMAT,
+                'version': STORE_VERSION,
+                'sample_rate': sample_rate,
+                'encoding': encoding,
+                'n_rows': len(table),
+                'n_unique_detections': len(det_offsets) - 1,
+                'columns': list(columns),
+                'table': schema,
+                'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            }, fh, indent=2)
+        return cls(directory)
+
+    @classmethod
+    def from_dataframe(cls, df: pd.DataFrame, directory: str | Path, sample_rate: int,
+                       encoding: str = 'delta-varint') -> 'PredictionsStore':
+        """Write predictions in the CSV layout (list columns as lists) as a store.
+
+        Rows of one record share a ground-truth list when they agree on it.
+        `det_indices` is derived from `det_times` (and `gt_indices` from
+        `gt_times`) when only the times are present; the column layout of `df`
+        is kept for `to_dataframe`.
+        """
+        det = cls._indices_column(df, 'det_indices', 'det_times', sample_rate)
+        gt = cls._indices_column(df, 'gt_indices', 'gt_times', sample_rate)
+        det_values, det_offsets = _ragged(det)
+        slots: Dict[tuple, int] = {}
+        gt_lists: List[List[int]] = []
+        gt_slot = np.empty(len(df), dtype=np.int32)
+        record_ids = df['record_id'].astype(str).tolist() if 'record_id' in df.columns else [''] * len(df)
+        for i, (record_id, values) in enumerate(zip(record_ids, gt)):
+            key = (record_id, tuple(values))
+            if key not in slots:
+                slots[key] = len(gt_lists)
+                gt_lists.append(list(values))
+            gt_slot[i] = slots[key]
+        gt_values, gt_offsets = _ragged(gt_lists)
+        table = df.drop(columns=[c for c in LIST_COLUMNS if c in df.columns]).reset_index(drop=True)
+        return cls.write(directory, table, det_values, det_offsets, gt_values, gt_offsets, gt_slot,
+                         sample_rate, list(df.columns), encoding)
+
+    @classmethod
+    def append(cls, directory: str | Path, **parts) -> 'PredictionsStore':
+        """Add rows (`write` arguments) as a new part, without rewriting existing data."""
+        parts_dir = Path(directory) / 'parts'
+        numbers = [int(d.name) for d in parts_dir.iterdir() if d.name.isdigit()] if parts_dir.is_dir() else []
+        n = max(numbers, default=-1) + 1
+        return cls.write(parts_dir / f'{n:04d}', **parts)
+
+    @property
+    def parts(self) -> List['PredictionsStore']:
+        """Stores appended to this one, in order (incomplete parts are skipped)."""
+        parts_dir = self.directory / 'parts'
+        if not parts_dir.is_dir():
+            return []
+        return [PredictionsStore(d) for d in sorted(parts_dir.iterdir()) if is_predictions_store(str(d))]
+
+    @staticmethod
+    def _indices_column(df: pd.DataFrame, indices_col: str, times_col: str, sample_rate: int) -> list:
+        if indices_col in df.columns:
+            return [list(v) for v in df[indices_col]]
+        if times_col in df.columns:
+            return [np.rint(np.asarray(v, dtype=float) * sample_rate).astype(np.int64).tolist()
+                    for v in df[times_col]]
+        return [[] for _ in range(len(df))]
+
+    def __len__(self) -> int:
+        return int(self.meta['n_rows'])
+
+    @property
+    def table(self) -> pd.DataFrame:
+        """Scalar columns of every row (text columns categorical)."""
+        if self._table is None:
+            with np.load(self.directory / 'table.npz') as arrays:
+                data = {}
+                for spec in self.meta['table']:
+                    values = arrays[spec['name']]
+                    if spec['kind'] == 'categorical':
+                        values = pd.Categorical.from_codes(values, categories=spec['categories'])
+                    data[spec['name']] = values
+            self._table = pd.DataFrame(data)
+        return self._table
+
+    @property
+    def duplication_rate(self) -> float:
+        """Fraction of rows whose detection list is a copy of another row's."""
+        return 1.0 - (len(self.det_offsets) - 1) / len(self) if len(self) else 0.0
+
+    def det_indices(self, i: int) -> np.ndarray:
+        slot = self.det_slot[i]
+        return self.det_values[self.det_offsets[slot]:self.det_offsets[slot + 1]].astype(np.int64)
+
+    def det_times(self, i: int) -> np.ndarray:
+        return self.det_indices(i) / self.sample_rate
+
+    def gt_indices(self, i: int) -> np.ndarray:
+        slot = self.gt_slot[i]
+        return self.gt_values[self.gt_offsets[slot]:self.gt_offsets[slot + 1]].astype(np.int64)
+
+    def gt_times(self, i: int) -> np.ndarray:
+        return self.gt_indices(i) / self.sample_rate
+
+    def list_columns(self) -> Dict[str, List[list]]:
+        """The list columns of every row as Python lists (CSV layout values).
+
+        Rows sharing a stored list share the same list objects.
+        """
+        rate = self.sample_rate
+        columns = {}
+        for name, values, offsets, slot in (('det', self.det_values, self.det_offsets, self.det_slot),
+                                            ('gt', self.gt_values, self.gt_offsets, self.gt_slot)):
+            values = np.asarray(values, dtype=np.int64)
+            indices = [values[a:b].tolist() for a, b in zip(offsets[:-1], offsets[1:])]
+            times = [[idx / rate for idx in lst] for lst in indices]
+            slot = slot.tolist()
+            columns[f'{name}_indices'] = [indices[s] for s in slot]
+            columns[f'{name}_times'] = [times[s] for s in slot]
+        return {name: columns[name] for name in LIST_COLUMNS}
+
+    def to_dataframe(self, parts: bool = True) -> pd.DataFrame:
+        """All rows in the predictions CSV layout (list columns as Python lists).
+
+        With `parts`, rows of appended parts follow this store's rows.
+        """
+        df = self.table.copy()
+        lists = self.list_columns()
+        for name in LIST_COLUMNS:
+            if name in self.meta['columns']:
+                df[name] = lists[name]
+        df = df[self.meta['columns']]
+        appended = self.parts if parts else []
+        if appended:
+            categorical = [c for c in df.columns if isinstance(df[c].dtype, pd.CategoricalDtype)]
+            df = pd.concat([df] + [part.to_dataframe(parts=False) for part in appended], ignore_index=True)
+            for name in categorical:
+                df[name] = df[name].astype('category')
+        return df
+
+    def iter_records(self) -> Iterator[Dict[str, Any]]:
+        """Rows as dicts in the JSONL layout (no `error` key on rows without one)."""
+        df = self.to_dataframe()
+        for row in df.to_dict('records'):
+            if 'error' in row and not isinstance(row['error'], str):
+                del row['error']
+            yield {k: (v.item() if isinstance(v, np.generic) else v) for k, v in row.items()}
+
+    def export_csv(self, path: str) -> None:
+        self.to_dataframe().to_csv(path, index=False)
+
+    def export_jsonl(self, path: str) -> None:
+        with open(path, 'w') as fh:
+            for row in self.iter_records():
+                fh.write(json.dumps(row) + '\n')
+
+
+def load_predictions(path: str) -> pd.DataFrame:
+    """Predictions in the CSV layout from a CSV, JSONL or predictions store.
+
+    List columns come back as Python lists; CSV list cells are parsed as JSON
+    (never evaluated as code).
+    """
+    if is_predictions_store(path):
+        return PredictionsStore(path).to_dataframe()
+    if path.endswith('.jsonl'):
+        with open(path, 'r') as fh:
+            return pd.DataFrame([json.loads(line) for line in fh if line.strip()])
+    # record_id repeats on every row of a record: categorical codes
+    df = pd.read_csv(path, dtype={'record_id': 'category'})
+    for col in LIST_COLUMNS:
+        if col in df.columns:
+            df[col] = parse_list_column(df[col].tolist())
+    return df
+
+
+def main():
+    ap = argparse.ArgumentParser(description='Converter previsões (CSV/JSONL) para o formato binário e exportar '
+                                             'um store de previsões para CSV/JSONL')
+    ap.add_argument('--input', required=True, help='CSV/JSONL de previsões ou diretório do store')
+    ap.add_argument('--output', default=None, help='Diretório do store a criar (ex.: results/adwin/predictions.store)')
+    ap.add_argument('--sample-rate', type=int, default=250, help='Frequência de amostragem (Hz) das previsões')
+    ap.add_argument('--encoding', default='delta-varint', choices=ENCODINGS,
+                    help='Codificação dos índices no store (delta-varint: ~2 bytes por detecção; int32: '
+                         'arrays simples, mapeados em memória)')
+    ap.add_argument('--csv', default=None, help='Exportar o store para este CSV')
+    ap.add_argument('--jsonl', default=None, help='Exportar o store para este JSONL')
+    args = ap.parse_args()
+
+    t0 = time.perf_counter()
+    if is_predictions_store(args.input):
+        store = PredictionsStore(args.input)
+    else:
+        if not args.output:
+            raise SystemExit('--output é obrigatório para converter um CSV/JSONL')
+        store = PredictionsStore.from_dataframe(load_predictions(args.input), args.output, args.sample_rate,
+                                               args.encoding)
+        print(f"Convertido {args.input} -> {store.directory}: {len(store):,} linhas "
+              f"em {time.perf_counter() - t0:.1f}s")
+    print(f"Listas de deteções distintas: {len(store.det_offsets) - 1:,} de {len(store):,} linhas "
+          f"(duplicação {store.duplication_rate:.1%})")
+    if args.csv:
+        store.export_csv(args.csv)
+        print(f"CSV exportado: {args.csv}")
+    if args.jsonl:
+        store.export_jsonl(args.jsonl)
+        print(f"JSONL exportado: {args.jsonl}")
+
+
+if __name__ == '__main__':
+    main()
@@ -8,7 +8,7 @@ from pathlib import Path
 def build_regime_change_column(df: pd.DataFrame, events_df: pd.DataFrame | None,
                                sample_rate: int, events_col_index: str | None,
                                events_col_time: str | None) -> pd.Series:
-    rc = np.zeros(len(df), dtype=int)
+    rc = np.zeros(len(df), dtype=np.int8)
     if events_df is None:
         return pd.Series(rc)
     if events_col_index and events_col_index in events_df.columns:
@@ -0,0 +1,214 @@
+"""Signal preprocessing stage shared by all detectors.
+
+Smoothing is a strictly causal moving average: the output at sample `t` is the
+mean of samples `[t - w + 1, t]` (fewer while the window fills up), computed
+from prefix sums at O(1) cost per sample. `StreamingMovingAverage` is the live
+(sample-by-sample or chunked) form; the batch helpers run the exact same
+arithmetic, so both produce bit-identical outputs, and several window sizes can
+share a single cumulative-sum pass.
+
+The same `ma_window` values appear in the grids of every detector, so the
+smoothed signal of a record is computed once and cached on disk as a `.npy`
+file that later runs (any detector, any rerun) open memory-mapped.
+
+Signals may be carried as float32 (`SIGNAL_DTYPES`): the arithmetic above
+always runs in float64 and only the stored/returned arrays are rounded, which
+halves cache files and the memory traffic of every pass over them. Detections
+can then differ from float64 runs; see `generate_predictions --dtype-parity`.
+
+Cache layout::
+
+    <cache_dir>/<dataset_hash>/<record_id>/n<length>_cma<window>_d<0|1>.npy
+    <cache_dir>/<dataset_hash>/<record_id>/n<length>_cma<window>_d<0|1>_f32.npy   # float32 entries
+"""
+from __future__ import annotations
+import hashlib
+import os
+from pathlib import Path
+from typing import Dict, Iterable
+
+import numpy as np
+
+PREPROCESS_CACHE_DEFAULT = os.path.join('data', 'cache', 'preprocessed')
+SIGNAL_DTYPES = ('float64', 'float32')
+
+
+class StreamingMovingAverage:
+    """Causal moving average with O(1) cost per sample.
+
+    Keeps the running cumulative sum and a ring buffer with the last `window`
+    prefix sums, so the window sum is a single subtraction. `update` consumes one
+    sample; `process` consumes a chunk (any size) and continues the same state.
+    """
+
+    def __init__(self, window: int):
+        if window < 1:
+            raise ValueError("window must be >= 1")
+        self.window = int(window)
+        self.reset()
+
+    def reset(self):
+        self._cum = 0.0
+        self._n = 0
+        # ring[k % window] holds prefix sum P[k] (sum of the first k samples)
+        self._ring = np.zeros(self.window)
+
+    def update(self, value: float) -> float:
+        w = self.window
+        self._ring[self._n % w] = self._cum
+        lag_k = self._n + 1 - w
+        lagged = float(self._ring[lag_k % w]) if lag_k > 0 else 0.0
+        self._cum = self._cum + float(value)
+        self._n += 1
+        if w == 1:
+            return float(value)  # window 1 is no smoothing
+        return (self._cum - lagged) / min(self._n, w)
+
+    def process(self, values) -> np.ndarray:
+        values = np.asarray(values, dtype=float)
+        m = values.size
+        if m == 0:
+            return np.empty(0)
+        w, n = self.window, self._n
+        # prefix[j] = P[n + j]; cumsum is a sequential left fold, matching `update`
+        prefix = np.cumsum(np.concatenate(([self._cum], values)))
+        k = np.arange(n + 1, n + m + 1)         # P index of each output
+        lag_k = np.maximum(k - w, 0)
+        lagged = np.where(lag_k >= n, prefix[np.clip(lag_k - n, 0, m)], 0.0)
+        from_ring = (lag_k < n) & (lag_k > 0)
+        lagged[from_ring] = self._ring[lag_k[from_ring] % w]
+        out = (prefix[1:] - lagged) / np.minimum(k, w) if w > 1 else values.copy()
+
+        # Store P[n .. n + m - 1] (the last `window` of them) in the ring
+        tail = np.arange(max(n, n + m - w), n + m)
+        self._ring[tail % w] = prefix[tail - n]
+        self._cum = float(prefix[-1])
+        self._n = n + m
+        return out
+
+
+def causal_moving_averages(signal, windows: Iterable[int]) -> Dict[int, np.ndarray]:
+    """Causal moving averages for several window sizes from one prefix-sum pass."""
+    signal = np.asarray(signal, dtype=float)
+    prefix = np.cumsum(np.concatenate(([0.0], signal)))
+    k = np.arange(1, signal.size + 1)
+    out = {}
+    for w in windows:
+        w = int(w)
+        if w <= 1:
+            out[w] = signal.copy()
+            continue
+        lag_k = np.maximum(k - w, 0)
+        out[w] = (prefix[1:] - prefix[lag_k]) / np.minimum(k, w)
+    return out
+
+
+def causal_moving_average(signal, window: int) -> np.ndarray:
+    """Causal moving average of a whole signal (batch form of `StreamingMovingAverage`)."""
+    return causal_moving_averages(signal, [window])[int(window)]
+
+
+def _first_difference(signal: np.ndarray) -> np.ndarray:
+    # simple first difference, pad with zero at start
+    diff = np.zeros_like(signal)
+    diff[1:] = np.diff(signal)
+    return diff
+
+
+def preprocess_signals(signal, ma_windows: Iterable[int | None], use_derivative: bool = False,
+                       dtype: str = 'float64') -> Dict[int | None, np.ndarray]:
+    """Preprocess one signal for several `ma_window` values sharing one cumsum pass.
+
+    The input is taken as `dtype` and the outputs are returned as `dtype`; the
+    smoothing itself runs in float64.
+    """
+    signal = np.asarray(signal, dtype=dtype).astype(float, copy=False)
+    ma_windows = list(ma_windows)
+    smoothed = causal_moving_averages(signal, {int(w) for w in ma_windows if w and w > 1})
+    out = {}
+    for w in ma_windows:
+        result = smoothed[int(w)] if (w and w > 1) else signal
+        result = _first_difference(result) if use_derivative else result
+        out[w] = result.astype(dtype, copy=False)
+    return out
+
+
+def preprocess_signal(signal, ma_window: int | None = None, use_derivative: bool = False,
+                      dtype: str = 'float64') -> np.ndarray:
+    """Apply causal moving-average smoothing and optional first difference."""
+    return preprocess_signals(signal, [ma_window], use_derivative, dtype)[ma_window]
+
+
+def dataset_fingerprint(path: str, head_bytes: int = 1 << 20) -> str:
+    """Cheap content hash of a dataset file: size, mtime and the first MiB.
+
+    For a binary dataset directory (`record_store`) the hash is that of its
+    `meta.json`, which is rewritten with every conversion.
+    """
+    if os.path.isdir(path):
+        path = os.path.join(path, 'meta.json')
+    st = os.stat(path)
+    h = hashlib.sha1()
+    h.update(f"{st.st_size}:{st.st_mtime_ns}".encode())
+    with open(path, 'rb') as fh:
+        h.update(fh.read(head_bytes))
+    return h.hexdigest()[:16]
+
+
+class PreprocessCache:
+    """On-disk cache of preprocessed signals keyed by
+    (dataset hash, record id, ma_window, use_derivative, dtype).
+
+    Entries are written atomically, so concurrent joblib workers computing the
+    same entry are safe; the last writer wins with identical content.
+    """
+
+    def __init__(self, cache_dir: str, dataset_hash: str, dtype: str = 'float64'):
+        if dtype not in SIGNAL_DTYPES:
+            raise ValueError(f"dtype must be one of {SIGNAL_DTYPES}, got {dtype!r}")
+        self.root = Path(cache_dir) / dataset_hash
+        self.dtype = dtype
+
+    def path_for(self, record_id: str, n_samples: int, ma_window: int | None, use_derivative: bool) -> Path:
+        window = int(ma_window) if ma_window and ma_window > 1 else 1
+        suffix = '' if self.dtype == 'float64' else '_f32'
+        return self.root / str(record_id) / f"n{n_samples}_cma{window}_d{int(bool(use_derivative))}{suffix}.npy"
+
+    def _load(self, path: Path):
+        if path.exists():
+            try:
+                return np.load(path, mmap_mode='r')
+            except (ValueError, OSError):
+                pass  # truncated/corrupt entry: recompute
+        return None
+
+    def _store(self, path: Path, processed: np.ndarray):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.stem}.{os.getpid()}.tmp.npy")
+        np.save(tmp_path, processed)
+        os.replace(tmp_path, path)
+
+    def get(self, record_id: str, signal, ma_window: int | None = None,
+            use_derivative: bool = False) -> np.ndarray:
+        """Return the preprocessed signal, computing and storing it on a miss."""
+        return self.get_many(record_id, signal, [ma_window], use_derivative)[ma_window]
+
+    def get_many(self, record_id: str, signal, ma_windows: Iterable[int | None],
+                 use_derivative: bool = False) -> Dict[int | None, np.ndarray]:
+        """Return preprocessed signals for several windows; misses share one cumsum pass."""
+        out = {}
+        missing = []
+        for w in ma_windows:
+            if not (w and w > 1) and not use_derivative:
+                out[w] = np.asarray(signal, dtype=self.dtype)
+                continue
+            cached = self._load(self.path_for(record_id, len(signal), w, use_derivative))
+            if cached is None:
+                missing.append(w)
+            else:
+                out[w] = cached
+        if missing:
+            for w, processed in preprocess_signals(signal, missing, use_derivative, self.dtype).items():
+                self._store(self.path_for(record_id, len(signal), w, use_derivative), processed)
+                out[w] = processed
+        return out
@@ -0,0 +1,262 @@
+"""Columnar binary dataset format for tidy ECG data (CSV stays import-only).
+
+A dataset directory holds one `.npy` file per column, with the rows of each
+record stored contiguously, a table of row offsets (`offsets[k]:offsets[k + 1]`
+are the rows of record `k`) and the regime changes as sparse per-record event
+lists instead of a dense 0/1 column. Everything is opened with
+`np.load(mmap_mode='r')`: loading is near-instant, every process (e.g. joblib
+workers) shares the same page-cache copy, and a `RecordStore` pickles as its
+directory plus the selected record indices rather than as the data itself.
+
+Layout::
+
+    <directory>/meta.json           # format, version, dtypes, row count, source
+    <directory>/ids.json            # record ids, in store order
+    <directory>/catalog.json        # per-record summary (see dataset_catalog)
+    <directory>/offsets.npy         # int64, n_records + 1
+    <directory>/ecg.npy             # float64 (default) or float32
+    <directory>/sample_index.npy    # int32/int64; omitted when it is 0..n-1 per record
+    <directory>/events.npy          # int64 row (within the record) of each regime change
+    <directory>/event_offsets.npy   # int64, n_records + 1
+
+One-shot conversion from an existing tidy CSV::
+
+    python -m src.record_store --input data/afib_paroxysmal_tidy.csv --output data/afib_paroxysmal.records
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+
+STORE_FORMAT = 'ecg-record-store'
+STORE_VERSION = 1
+ECG_DTYPES = ('float64', 'float32')
+STORE_COLUMNS = ('sample_index', 'ecg', 'regime_change')
+
+
+def is_record_store(path: Optional[str]) -> bool:
+    """True if `path` is a dataset directory written by `RecordStore.from_dataframe`."""
+    return bool(path) and os.path.isfile(os.path.join(path, 'meta.json'))
+
+
+class RecordStore:
+    """Record-sliced, memory-mapped view of a binary dataset directory.
+
+    `records` optionally restricts the view to a subset of the stored records
+    (global indices); record `k` of the view is stored record `records[k]`.
+    `record_frame(k)` returns its rows in the tidy layout.
+    """
+
+    def __init__(self, directory: str | Path, records: Optional[Sequence[int]] = None):
+        self.directory = Path(directory)
+        with open(self.directory / 'meta.json') as fh:
+            self.meta = json.load(fh)
+        if self.meta.get('format') != STORE_FORMAT:
+            raise ValueError(f"{self.directory} não é um dataset binário ({STORE_FORMAT}).")
+        with open(self.directory / 'ids.json') as fh:
+            all_ids: List[str] = json.load(fh)
+        self._offsets = np.load(self.directory / 'offsets.npy')
+        self._event_offsets = np.load(self.directory / 'event_offsets.npy')
+        self.events = np.load(self.directory / 'events.npy', mmap_mode='r')
+        self.ecg = np.load(self.directory / 'ecg.npy', mmap_mode='r')
+        sample_index_path = self.directory / 'sample_index.npy'
+        self.sample_index = np.load(sample_index_path, mmap_mode='r') if sample_index_path.exists() else None
+
+        self.records = np.arange(len(all_ids)) if records is None else np.asarray(records, dtype=np.int64)
+        self.ids = [all_ids[k] for k in self.records.tolist()]
+
+    @classmethod
+    def from_dataframe(cls, df: pd.DataFrame, directory: str | Path, ecg_dtype: str = 'float64',
+                       source: Optional[str] = None) -> 'RecordStore':
+        """Write `df` (tidy, with an `id` column) as a dataset directory.
+
+        Records keep the order of their first appearance in `df` (the order of
+        `df['id'].unique()`) and rows keep their order within each record.
+        """
+        codes, ids = pd.factorize(df['id'])
+        order = np.argsort(codes, kind='stable')
+        counts = np.bincount(codes, minlength=len(ids))
+        offsets = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+        row_in_record = np.arange(len(df)) - np.repeat(offsets[:-1], counts)
+
+        changes = np.flatnonzero(df['regime_change'].to_numpy()[order] == 1)
+        sample_index = df['sample_index'].to_numpy()[order]
+        if np.array_equal(sample_index, row_in_record):
+            sample_index = None
+        return cls._write(directory, [str(i) for i in ids], offsets, df['ecg'].to_numpy()[order],
+                          row_in_record[changes], np.searchsorted(changes, offsets),
+                          sample_index, ecg_dtype, source)
+
+    @classmethod
+    def from_records(cls, directory: str | Path, ids: Sequence[str], signals: Sequence[np.ndarray],
+                     events: Sequence[np.ndarray], ecg_dtype: str = 'float64',
+                     source: Optional[str] = None) -> 'RecordStore':
+        """Write per-record signals and regime-change rows as a dataset directory.
+
+        `events[k]` are rows of `signals[k]` (clipped to the record, sorted and
+        deduplicated here); no dense marker column is ever built.
+        """
+        counts = np.array([len(sig) for sig in signals], dtype=np.int64)
+        offsets = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+        events = [np.unique(np.clip(np.asarray(ev, dtype=np.int64), 0, max(n - 1, 0))) if n else
+                  np.empty(0, dtype=np.int64) for ev, n in zip(events, counts.tolist())]
+        event_offsets = np.concatenate(([0], np.cumsum([ev.size for ev in events]))).astype(np.int64)
+        ecg = np.concatenate(signals) if len(signals) else np.empty(0)
+        all_events = np.concatenate(events) if events else np.empty(0, dtype=np.int64)
+        return cls._write(directory, [str(i) for i in ids], offsets, ecg, all_events, event_offsets,
+                          None, ecg_dtype, source)
+
+    @classmethod
+    def _write(cls, directory, ids: List[str], offsets: np.ndarray, ecg: np.ndarray,
+               events: np.ndarray, event_offsets: np.ndarray, sample_index: Optional[np.ndarray],
+               ecg_dtype: str, source: Optional[str]) -> 'RecordStore':
+        if ecg_dtype not in ECG_DTYPES:
+            raise ValueError(f"ecg_dtype inválido: {ecg_dtype}. Opções: {', '.join(ECG_DTYPES)}")
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        np.save(directory / 'offsets.npy', np.asarray(offsets, dtype=np.int64))
+        np.save(directory / 'ecg.npy', np.asarray(ecg).astype(ecg_dtype))
+        np.save(directory / 'events.npy', np.asarray(events, dtype=np.int64))
+        np.save(directory / 'event_offsets.npy', np.asarray(event_offsets, dtype=np.int64))
+        if sample_index is not None:
+            index_dtype = np.int32 if sample_index.size == 0 or sample_index.max() < 2 ** 31 else np.int64
+            np.save(directory / 'sample_index.npy', sample_index.astype(index_dtype))
+        elif (directory / 'sample_index.npy').exists():
+            os.remove(directory / 'sample_index.npy')
+        with open(directory / 'ids.json', 'w') as fh:
+            json.dump(ids, fh)
+
+        # Per-record summary, same columns as dataset_catalog.summarize_records
+        catalog = {col: [] for col in ('id', 'row_start', 'row_stop', 'n_samples', 'n_regime_changes',
+                                       'ecg_mean', 'ecg_std', 'ecg_min', 'ecg_max')}
+        ecg64 = np.asarray(ecg, dtype=float)
+        for k, rid in enumerate(ids):
+            start, stop = int(offsets[k]), int(offsets[k + 1])
+            sig = ecg64[start:stop]
+            catalog['id'].append(rid)
+            catalog['row_start'].append(start)
+            catalog['row_stop'].append(stop)
+            catalog['n_samples'].append(stop - start)
+            catalog['n_regime_changes'].append(int(event_offsets[k + 1] - event_offsets[k]))
+            for name, fn in (('ecg_mean', np.mean), ('ecg_std', np.std), ('ecg_min', np.min), ('ecg_max', np.max)):
+                catalog[name].append(float(fn(sig)) if sig.size else float('nan'))
+        with open(directory / 'catalog.json', 'w') as fh:
+            json.dump(catalog, fh)
+
+        # meta.json last: its presence marks a complete directory
+        with open(directory / 'meta.json', 'w') as fh:
+            json.dump({
+                'format': STORE_FORMAT,
+                'version': STORE_VERSION,
+                'n_rows': int(offsets[-1]),
+                'n_records': len(ids),
+                'ecg_dtype': ecg_dtype,
+                'implicit_sample_index': sample_index is None,
+                'source': source,
+                'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            }, fh, indent=2)
+        return cls(directory)
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def __getstate__(self):
+        # Workers reopen the memory maps instead of receiving the data
+        return {'directory': str(self.directory), 'records': self.records}
+
+    def __setstate__(self, state):
+        self.__init__(state['directory'], state['records'])
+
+    def select(self, record_ids: Optional[Sequence[str]] = None,
+               max_records: Optional[int] = None) -> 'RecordStore':
+        """View of `record_ids` (store order) and/or the first `max_records` records."""
+        records = self.records
+        if record_ids is not None:
+            wanted = {str(r) for r in record_ids}
+            records = records[[rid in wanted for rid in self.ids]]
+        if max_records:
+            records = records[:max_records]
+        return RecordStore(self.directory, records)
+
+    @property
+    def catalog(self) -> pd.DataFrame:
+        """Per-record summary of the records in view (`dataset_catalog.summarize_records`)."""
+        with open(self.directory / 'catalog.json') as fh:
+            catalog = pd.DataFrame(json.load(fh))
+        return catalog.iloc[self.records].reset_index(drop=True)
+
+    def record_slice(self, k: int) -> slice:
+        g = self.records[k]
+        return slice(int(self._offsets[g]), int(self._offsets[g + 1]))
+
+    def record_events(self, k: int) -> np.ndarray:
+        """Sorted rows (within record `k`) of its regime changes."""
+        g = self.records[k]
+        return self.events[self._event_offsets[g]:self._event_offsets[g + 1]]
+
+    def record_columns(self, k: int) -> Dict[str, np.ndarray]:
+        """Tidy columns of record `k`; `ecg` is a view of the mapped file."""
+        rows = self.record_slice(k)
+        n = rows.stop - rows.start
+        if self.sample_index is None:
+            sample_index = np.arange(n, dtype=np.int64)
+        else:
+            sample_index = self.sample_index[rows]
+        regime_change = np.zeros(n, dtype=np.int8)
+        regime_change[self.record_events(k)] = 1
+        return {'sample_index': sample_index, 'ecg': self.ecg[rows], 'regime_change': regime_change}
+
+    def record_frame(self, k: int, columns: Sequence[str] = STORE_COLUMNS) -> pd.DataFrame:
+        """Rows of record `k` (fresh RangeIndex), like `df[df['id'] == id]`."""
+        data = self.record_columns(k)
+        return pd.DataFrame({col: data[col] for col in columns})
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """All records in view in the tidy CSV layout (`id` first, categorical)."""
+        if not len(self):
+            return pd.DataFrame(columns=['id', *STORE_COLUMNS])
+        df = pd.concat([self.record_frame(k) for k in range(len(self))], ignore_index=True)
+        counts = np.diff(self._offsets)[self.records]
+        df.insert(0, 'id', pd.Categorical.from_codes(np.repeat(np.arange(len(self)), counts),
+                                                     categories=self.ids))
+        return df
+
+
+def convert_csv(csv_path: str, output_dir: str, ecg_dtype: str = 'float64') -> RecordStore:
+    """One-shot conversion of a tidy CSV into a dataset directory."""
+    # Imported here: data_loader itself reads dataset directories through this module
+    from .data_loader import load_dataset
+
+    df, _ = load_dataset(csv_path)
+    if 'id' not in df.columns:
+        df.insert(0, 'id', Path(csv_path).stem)
+    if os.path.isdir(output_dir):
+        shutil.rmtree(output_dir)
+    return RecordStore.from_dataframe(df, output_dir, ecg_dtype=ecg_dtype, source=str(csv_path))
+
+
+def main():
+    ap = argparse.ArgumentParser(description='Converter CSV tidy (id, sample_index, ecg, regime_change) '
+                                             'para o formato binário colunar')
+    ap.add_argument('--input', required=True, help='CSV tidy de entrada')
+    ap.add_argument('--output', required=True, help='Diretório de saída (ex.: data/afib_paroxysmal.records)')
+    ap.add_argument('--ecg-dtype', default='float64', choices=ECG_DTYPES,
+                    help='Tipo da coluna ecg (float32 ocupa metade, mas altera as detecções face ao CSV)')
+    args = ap.parse_args()
+
+    t0 = time.perf_counter()
+    store = convert_csv(args.input, args.output, ecg_dtype=args.ecg_dtype)
+    print(f"Convertido {args.input} -> {store.directory}: {store.meta['n_rows']:,} linhas, "
+          f"{len(store)} registos em {time.perf_counter() - t0:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
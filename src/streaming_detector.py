@@ -6,12 +6,112 @@ import json
 import os
 from datetime import datetime, timezone
 
-from .data_loader import load_dataset
-from .detectors import build_detector
+from .data_loader import load_dataset, regime_events
+from .detectors import ENGINES, DriftDetectorWrapper, build_detector
+from .postfilters import apply_min_gap
+from .preprocessing import SIGNAL_DTYPES, StreamingMovingAverage, preprocess_signal
+from .utils import chunk_array
 from .evaluation import DetectionEvent, evaluate_detections, evaluate_detections_comprehensive
+from .index_codec import IndexLogWriter
 import numpy as np
 
 
+DEFAULT_BATCH = 250  # 1 s frames at 250 Hz
+
+
+def run_detector_on_array(detector: DriftDetectorWrapper, values: np.ndarray,
+                          sample_indices: np.ndarray | None = None,
+                          batch: int | None = None) -> np.ndarray:
+    """Array-native streaming core: feed `values` to `detector` in order.
+
+    The signal is fed in frames of `batch` samples through
+    `DriftDetectorWrapper.add_elements` (whole signal at once when `batch` is
+    None); detections do not depend on the frame size. Returns the raw
+    (unfiltered) detections as an int64 array of `sample_indices` (positions
+    within `values` when omitted). No pandas on the hot path.
+    """
+    values = np.ascontiguousarray(values, dtype=np.float64)
+    found = [detector.add_elements(frame) + start for start, frame in chunk_array(values, batch)]
+    positions = np.concatenate(found) if found else np.empty(0, dtype=np.int64)
+    if sample_indices is None:
+        return positions
+    return np.asarray(sample_indices, dtype=np.int64)[positions]
+
+
+class StreamProcessor:
+    """Live form of the pipeline: causal smoothing -> detector -> min_gap filter.
+
+    `process(values)` accepts frames of any size (e.g. 250 samples = 1 s, or a
+    single sample) and returns the absolute sample indices of accepted
+    detections in that frame. Any framing of a record gives the same detections
+    as `run_stream_on_dataframe`.
+    """
+
+    def __init__(self, detector_name: str, detector_params: dict | None = None,
+                 ma_window: int | None = None, use_derivative: bool = False,
+                 min_gap_samples: int | None = None, engine: str = 'skmultiflow'):
+        self.detector = build_detector(detector_name, engine=engine, **(detector_params or {}))
+        self.smoother = StreamingMovingAverage(ma_window) if ma_window and ma_window > 1 else None
+        self.use_derivative = use_derivative
+        self.min_gap_samples = min_gap_samples
+        self.n_samples = 0
+        self._last_value = None
+        self._last_detection = None
+
+    def process(self, values) -> np.ndarray:
+        values = np.asarray(values, dtype=np.float64)
+        if values.size == 0:
+            return np.empty(0, dtype=np.int64)
+        if self.smoother is not None:
+            values = self.smoother.process(values)
+        if self.use_derivative:
+            prev = values[0] if self._last_value is None else self._last_value
+            self._last_value = values[-1]
+            values = np.diff(values, prepend=prev)
+        start = self.n_samples
+        self.n_samples += values.size
+        raw = self.detector.add_elements(values) + start
+        if self.min_gap_samples is None or raw.size == 0:
+            return raw
+        if self._last_detection is not None:
+            raw = raw[raw >= self._last_detection + self.min_gap_samples]
+        accepted = apply_min_gap(raw, self.min_gap_samples)
+        if accepted.size:
+            self._last_detection = int(accepted[-1])
+        return accepted
+
+
+def detect_on_dataframe(
+        df,
+        detector_name: str,
+        detector_params: dict | None = None,
+        ma_window: int | None = None,
+        use_derivative: bool = False,
+        min_gap_samples: int | None = None,
+        signal: np.ndarray | None = None,
+        batch: int | None = DEFAULT_BATCH,
+        engine: str = 'skmultiflow',
+        signal_dtype: str = 'float64',
+):
+    """Detection-only entry point: run one detector over a loaded dataframe.
+
+    Returns `(det_indices, detector_name)` where `det_indices` is the int64
+    array of detected `sample_index` values after the `min_gap_samples`
+    post-filter. No `DetectionEvent` objects are built and nothing is
+    evaluated; `run_stream_on_dataframe` adds both on top of this.
+    `signal_dtype` is the dtype the preprocessed signal is kept in
+    (`preprocessing.SIGNAL_DTYPES`); the detector computes in float64.
+    """
+    detector = build_detector(detector_name, engine=engine, **(detector_params or {}))
+
+    if signal is None:
+        signal = preprocess_signal(df['ecg'].values, ma_window, use_derivative, dtype=signal_dtype)
+
+    # Streaming loop (array-native core) + min_gap post-filter
+    raw_indices = run_detector_on_array(detector, signal, df['sample_index'].values, batch=batch)
+    return apply_min_gap(raw_indices, min_gap_samples), detector.name
+
+
 def run_stream_on_dataframe(
         df,
         detector_name: str,
@@ -21,9 +121,22 @@ def run_stream_on_dataframe(
         ma_window: int | None = None,
         use_derivative: bool = False,
         min_gap_samples: int | None = None,
+        signal: np.ndarray | None = None,
+        batch: int | None = DEFAULT_BATCH,
+        engine: str = 'skmultiflow',
+        gt_indices: np.ndarray | None = None,
+        signal_dtype: str = 'float64',
 ):
     """Core logic operating on an already loaded dataframe.
 
+    `signal` may carry the already preprocessed (smoothed/differenced) ECG, e.g.
+    from `preprocessing.PreprocessCache`; `ma_window`/`use_derivative` are then
+    not applied again. The signal is fed to the detector in frames of `batch`
+    samples (`DriftDetectorWrapper.add_elements`). `engine` selects the detector
+    implementation (see `detectors.ENGINES`). `gt_indices` (sorted ground-truth
+    change indices, `data_loader.regime_events`) is derived from
+    `df['regime_change']` when omitted. `signal_dtype` as in `detect_on_dataframe`.
+
     Notes:
     - `min_gap_samples` is a post-processing filter applied by the pipeline. It is NOT a
         parameter of the detector implementations (scikit-multiflow). Detectors output the
@@ -33,58 +146,49 @@ def run_stream_on_dataframe(
     - Example: if `min_gap_samples=1000` (4s @ 250 Hz), when one detection is accepted,
         any subsequent detection within the next 1000 samples is ignored.
     """
-    detector = build_detector(detector_name, **(detector_params or {}))
-
-    events: List[DetectionEvent] = []
-
-    signal = df['ecg'].values.astype(float)
-    if ma_window and ma_window > 1:
-        kernel = np.ones(ma_window) / ma_window
-        signal = np.convolve(signal, kernel, mode='same')
-    if use_derivative:
-        # simple first difference, pad with zero at start
-        diff = np.zeros_like(signal)
-        diff[1:] = np.diff(signal)
-        signal = diff
-
-    # Streaming loop
-    last_detection_idx = -10**12
-    for idx, row in enumerate(df.itertuples()):
-        value = float(signal[idx])
-        detected = detector.add_element(value)
-        if detected:
-            if min_gap_samples is not None and (row.sample_index - last_detection_idx) < min_gap_samples:
-                continue
-            last_detection_idx = row.sample_index
-            events.append(DetectionEvent(detector=detector.name,
-                                         sample_index=row.sample_index,
-                                         time_seconds=row.sample_index / sample_rate))
+    det_indices, resolved_name = detect_on_dataframe(
+        df, detector_name, detector_params=detector_params, ma_window=ma_window,
+        use_derivative=use_derivative, min_gap_samples=min_gap_samples,
+        signal=signal, batch=batch, engine=engine, signal_dtype=signal_dtype)
+    events: List[DetectionEvent] = [
+        DetectionEvent(detector=resolved_name, sample_index=idx, time_seconds=idx / sample_rate)
+        for idx in det_indices.tolist()
+    ]
+
+    if gt_indices is None:
+        gt_indices = df.index[regime_events(df['regime_change'])]
 
     # Use comprehensive evaluation that includes both classic and F1* metrics
     metrics = evaluate_detections_comprehensive(
         events, df, sample_rate,
         tolerance=tolerance,
-        signal_duration_samples=len(df)
+        signal_duration_samples=len(df),
+        gt_indices=gt_indices
     )
 
     # Output results
-    return events, metrics, detector.name
+    return events, metrics, resolved_name
 
 
-def run_stream(data_path: str | None, detector_name: str, sample_rate: int, batch: int = 1, tolerance: int = 50,
+def run_stream(data_path: str | None, detector_name: str, sample_rate: int, batch: int = DEFAULT_BATCH, tolerance: int = 50,
                force_regenerate: bool = False, n_segments: int = 5, segment_length: int = 1000, detector_params: dict | None = None,
                ma_window: int | None = None, use_derivative: bool = False, min_gap_samples: int | None = None,
-               log_json: bool = True, log_dir: str = 'results'):
+               log_json: bool = True, log_dir: str = 'results', engine: str = 'skmultiflow',
+               signal_dtype: str = 'float64', events_format: str = 'csv'):
     df, sample_rate = load_dataset(data_path, sample_rate, force_regenerate=force_regenerate,
-                                   n_segments=n_segments, segment_length=segment_length)
+                                   n_segments=n_segments, segment_length=segment_length,
+                                   signal_dtype=signal_dtype)
+    gt_indices = regime_events(df['regime_change'])
     events, metrics, detector_name_resolved = run_stream_on_dataframe(df, detector_name, sample_rate, tolerance=tolerance,
                                                                       detector_params=detector_params, ma_window=ma_window,
-                                                                      use_derivative=use_derivative, min_gap_samples=min_gap_samples)
+                                                                      use_derivative=use_derivative, min_gap_samples=min_gap_samples,
+                                                                      batch=batch, engine=engine, gt_indices=gt_indices,
+                                                                      signal_dtype=signal_dtype)
 
     print("=== RESULTADOS DETECÇÃO ===")
     print(f"Detector: {detector_name_resolved}")
     print(f"Total amostras: {len(df)}")
-    print(f"Mudanças verdade (gt): {int(df['regime_change'].sum())}")
+    print(f"Mudanças verdade (gt): {len(gt_indices)}")
     print(f"Detecções: {len(events)}")
     print("-- Métricas --")
     for k, v in metrics.items():
@@ -94,9 +198,14 @@ def run_stream(data_path: str | None, detector_name: str, sample_rate: int, batc
     for ev in events[:20]:
         print(f"sample_index={ev.sample_index} time_s={ev.time_seconds:.3f}")
 
-    # CSV de saída de eventos
-    out_events_path = 'data/detections_' + detector_name_resolved + '.csv'
-    pd.DataFrame([e.__dict__ for e in events]).to_csv(out_events_path, index=False)
+    # Eventos: CSV (índice + tempo) ou log de índices delta-varint (tempo = índice / sample_rate)
+    if events_format == 'varint':
+        out_events_path = 'data/detections_' + detector_name_resolved + '.idx'
+        with IndexLogWriter(out_events_path) as log:
+            log.append([e.sample_index for e in events])
+    else:
+        out_events_path = 'data/detections_' + detector_name_resolved + '.csv'
+        pd.DataFrame([e.__dict__ for e in events]).to_csv(out_events_path, index=False)
     print(f"Eventos exportados em: {out_events_path}")
 
     # Logging JSON
@@ -113,6 +222,9 @@ def run_stream(data_path: str | None, detector_name: str, sample_rate: int, batc
             'ma_window': ma_window,
             'use_derivative': use_derivative,
             'min_gap_samples': min_gap_samples,
+            'engine': engine,
+            'signal_dtype': signal_dtype,
+            'batch': batch,
             'data_path': data_path,
             'synthetic': data_path is None,
             'n_segments': n_segments,
@@ -121,7 +233,8 @@ def run_stream(data_path: str | None, detector_name: str, sample_rate: int, batc
             'metrics': metrics,
             'events_count': len(events),
             'events_preview': [e.__dict__ for e in events[:10]],
-            'events_csv': out_events_path,
+            'events_csv': out_events_path if events_format == 'csv' else None,
+            'events_index_log': out_events_path if events_format == 'varint' else None,
             'f1_classic': metrics.get('f1_classic', 0),
             'f1_star': metrics.get('f1star_f1_star', 0)
         }
@@ -145,6 +258,14 @@ def parse_args():
     ap.add_argument('--ma-window', type=int, default=None, help='Tamanho janela média móvel para suavizar')
     ap.add_argument('--derivative', action='store_true', help='Usar derivada primeira do sinal (diferença)')
     ap.add_argument('--min-gap-samples', type=int, default=None, help='Número mínimo de samples entre detecções consecutivas (filtro de pós-processamento aplicado após o detector)')
+    ap.add_argument('--batch', type=int, default=DEFAULT_BATCH, help='Tamanho do bloco de amostras entregue ao detector por chamada (default: 250 = 1 s @ 250 Hz)')
+    ap.add_argument('--engine', type=str, default='skmultiflow', choices=ENGINES,
+                    help="Implementação do detector: skmultiflow | native (ADWIN in-repo) | incremental (KSWIN in-repo) | reference (engine in-repo verificada contra skmultiflow)")
+    ap.add_argument('--signal-dtype', type=str, default='float64', choices=SIGNAL_DTYPES,
+                    help='Tipo do sinal carregado e pré-processado (float32 ocupa metade; o detetor calcula em float64)')
+    ap.add_argument('--events-format', type=str, default='csv', choices=['csv', 'varint'],
+                    help='Formato do ficheiro de eventos: csv (índice e tempo) ou varint (log binário só com '
+                         'índices delta-varint, ~2 bytes por evento; ler com index_codec.read_index_log)')
     ap.add_argument('--log-json-dir', type=str, default='results', help='Diretório para salvar logs JSON')
     ap.add_argument('--no-json-log', action='store_true', help='Desativa logging JSON')
     return ap.parse_args()
@@ -168,8 +289,9 @@ if __name__ == '__main__':
         except ValueError:
             det_params[k] = v
 
-    run_stream(args.data, args.detector, args.sample_rate, tolerance=args.tolerance,
+    run_stream(args.data, args.detector, args.sample_rate, batch=args.batch, tolerance=args.tolerance,
                force_regenerate=args.force_regen, n_segments=args.segments, segment_length=args.segment_length,
                detector_params=det_params, ma_window=args.ma_window, use_derivative=args.derivative,
                min_gap_samples=args.min_gap_samples, log_json=not args.no_json_log,
-               log_dir=args.log_json_dir)
+               log_dir=args.log_json_dir, engine=args.engine, signal_dtype=args.signal_dtype,
+               events_format=args.events_format)
@@ -1,5 +1,7 @@
 from __future__ import annotations
-from typing import Iterable
+from typing import Iterable, Iterator, Tuple
+
+import numpy as np
 
 def chunk_iterable(it: Iterable, size: int):
     buf = []
@@ -10,3 +12,12 @@ def chunk_iterable(it: Iterable, size: int):
             buf = []
     if buf:
         yield buf
+
+
+def chunk_array(values: np.ndarray, size: int | None) -> Iterator[Tuple[int, np.ndarray]]:
+    """Yield `(start, view)` frames of `size` samples (one frame if size is None/<= 0)."""
+    n = len(values)
+    if not size or size <= 0:
+        size = max(n, 1)
+    for start in range(0, n, size):
+        yield start, values[start:start + size]